@@ -0,0 +1,188 @@
+"""
+Effective permissions of every user, for access reviews.
+
+Role grants are loaded once into a sparse roles x permissions matrix, with
+role inheritance and wildcard permissions already folded in. Users are then
+read in keyset batches of --batch-size, each batch becoming a sparse
+users x roles matrix, and one matrix product gives the batch's effective
+permissions. Batches are appended to a Parquet file as row groups of
+(user_id, username, permissions), where permissions is a list of
+dictionary-encoded names, so neither the matrix nor the file is ever held
+in memory as a whole. Needs the packages in requirements-reports.txt.
+Run from the backend directory:
+
+    python -m app.access_report --output access_review.parquet
+"""
+import argparse
+import time
+
+from sqlalchemy import select
+
+from .models import User, Role, Permission, user_roles, role_hierarchy, role_permissions
+from .permission_engine import _transitive_closure
+from .permission_patterns import PatternTrie, is_pattern
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from scipy import sparse
+except ImportError as error:
+    raise ImportError(
+        "The access report needs numpy, scipy and pyarrow: pip install -r requirements-reports.txt"
+    ) from error
+
+DEFAULT_BATCH_SIZE = 50000
+
+SCHEMA = pa.schema([
+    ("user_id", pa.int64()),
+    ("username", pa.string()),
+    ("permissions", pa.list_(pa.dictionary(pa.int32(), pa.string()))),
+])
+
+
+class RoleMatrix:
+    """
+    Effective permissions of each role as a boolean CSR matrix.
+    Rows follow `role_ids` (sorted) and columns follow `permission_names`.
+    """
+
+    def __init__(self, role_ids, permission_names, grants, edges=()):
+        self.role_ids = np.asarray(sorted(role_ids), dtype=np.int64)
+        self.permission_names = pa.array(permission_names, type=pa.string())
+        roles, permissions = len(self.role_ids), len(permission_names)
+
+        rows, columns = self._pairs(grants, self.role_ids, np.arange(permissions))
+        direct = sparse.csr_matrix((np.ones(len(rows), np.int32), (rows, columns)), shape=(roles, permissions))
+
+        # Inheritance: each role gets the direct grants of its whole closure
+        children = {}
+        for parent_id, child_id in edges:
+            children.setdefault(parent_id, set()).add(child_id)
+        closure = _transitive_closure(self.role_ids.tolist(), children)
+        reach = [(role_id, reached) for role_id, reachable in closure.items() for reached in reachable]
+        rows, columns = self._pairs(reach, self.role_ids, self.role_ids)
+        inherits = sparse.csr_matrix((np.ones(len(rows), np.int32), (rows, columns)), shape=(roles, roles))
+
+        # Wildcards: a granted pattern also grants every permission it matches
+        implied = [(bit, bit) for bit in range(permissions)]
+        for bit, name in enumerate(permission_names):
+            if is_pattern(name):
+                trie = PatternTrie([name])
+                implied.extend((bit, other) for other, other_name in enumerate(permission_names)
+                               if other != bit and trie.matches(other_name))
+        rows, columns = zip(*implied) if implied else ((), ())
+        expands = sparse.csr_matrix(
+            (np.ones(len(rows), np.int32), (rows, columns)), shape=(permissions, permissions)
+        )
+
+        self.matrix = (inherits @ direct @ expands).astype(bool).tocsr()
+        self.matrix.sort_indices()
+
+    @staticmethod
+    def _pairs(pairs, row_keys, column_keys):
+        """Map (row key, column key) pairs to matrix coordinates, dropping unknown keys"""
+        pairs = np.asarray(list(pairs), dtype=np.int64).reshape(-1, 2)
+        rows = _positions(row_keys, pairs[:, 0])
+        columns = _positions(column_keys, pairs[:, 1])
+        known = (rows >= 0) & (columns >= 0)
+        return rows[known], columns[known]
+
+    @classmethod
+    def load(cls, connection):
+        permissions = connection.execute(select(Permission.id, Permission.name).order_by(Permission.id)).all()
+        permission_ids = np.asarray([permission_id for permission_id, _ in permissions], dtype=np.int64)
+        grants = connection.execute(select(role_permissions.c.role_id, role_permissions.c.permission_id)).all()
+        role_ids = connection.execute(select(Role.id)).scalars().all()
+        edges = connection.execute(select(role_hierarchy.c.parent_id, role_hierarchy.c.child_id)).all()
+        # Columns are permission positions, not ids
+        bits = _positions(permission_ids, np.asarray([permission_id for _, permission_id in grants], dtype=np.int64))
+        grants = [(role_id, bit) for (role_id, _), bit in zip(grants, bits.tolist())]
+        return cls(role_ids, [name for _, name in permissions], grants, edges)
+
+    def effective(self, rows, role_ids, users: int):
+        """
+        Boolean users x permissions CSR for one batch: `rows` are the users'
+        positions in the batch and `role_ids` the roles assigned to them.
+        """
+        columns = _positions(self.role_ids, np.asarray(role_ids, dtype=np.int64))
+        rows = np.asarray(rows, dtype=np.int64)
+        known = (columns >= 0) & (rows >= 0)
+        assigned = sparse.csr_matrix(
+            (np.ones(int(known.sum()), np.int32), (rows[known], columns[known])),
+            shape=(users, len(self.role_ids)),
+        )
+        granted = (assigned @ self.matrix).tocsr()
+        granted.sort_indices()
+        return granted
+
+    def record_batch(self, user_ids, usernames, granted) -> pa.RecordBatch:
+        names = pa.DictionaryArray.from_arrays(pa.array(granted.indices, type=pa.int32()), self.permission_names)
+        permissions = pa.ListArray.from_arrays(pa.array(granted.indptr, type=pa.int32()), names)
+        return pa.RecordBatch.from_arrays(
+            [pa.array(user_ids, type=pa.int64()), pa.array(usernames, type=pa.string()), permissions],
+            schema=SCHEMA,
+        )
+
+
+def _positions(keys, values):
+    """Index of each value in the sorted `keys`, or -1 where it is missing"""
+    if not len(keys):
+        return np.full(len(values), -1, dtype=np.int64)
+    index = np.searchsorted(keys, values).clip(max=len(keys) - 1)
+    return np.where(keys[index] == values, index, -1)
+
+
+def user_batches(connection, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Yield (user_ids, usernames, rows, role_ids) per keyset page of users,
+    where rows index user_ids. Users without roles are included.
+    """
+    after = 0
+    while True:
+        users = connection.execute(
+            select(User.id, User.username).where(User.id > after).order_by(User.id).limit(batch_size)
+        ).all()
+        if not users:
+            return
+        user_ids = np.asarray([user_id for user_id, _ in users], dtype=np.int64)
+        assignments = connection.execute(
+            select(user_roles.c.user_id, user_roles.c.role_id)
+            .where(user_roles.c.user_id.between(int(user_ids[0]), int(user_ids[-1])))
+        ).all()
+        pairs = np.asarray(assignments, dtype=np.int64).reshape(-1, 2)
+        yield user_ids, [username for _, username in users], _positions(user_ids, pairs[:, 0]), pairs[:, 1]
+        after = int(user_ids[-1])
+
+
+def write_report(role_matrix: RoleMatrix, batches, path, compression: str = "zstd") -> int:
+    """Write one row group per batch; returns the number of users written"""
+    count = 0
+    with pq.ParquetWriter(path, SCHEMA, compression=compression) as writer:
+        for user_ids, usernames, rows, role_ids in batches:
+            granted = role_matrix.effective(rows, role_ids, len(user_ids))
+            writer.write_batch(role_matrix.record_batch(user_ids, usernames, granted))
+            count += len(user_ids)
+    return count
+
+
+def export(engine, path, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    with engine.connect() as connection:
+        role_matrix = RoleMatrix.load(connection)
+        return write_report(role_matrix, user_batches(connection, batch_size), path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export every user's effective permissions to Parquet")
+    parser.add_argument("--output", default="access_review.parquet")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="users per matrix product and row group")
+    args = parser.parse_args(argv)
+
+    from .database import engine
+    start = time.perf_counter()
+    count = export(engine, args.output, args.batch_size)
+    print(f"{count} users written to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
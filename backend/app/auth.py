@@ -1,12 +1,104 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from jose import jwt
+from .metrics import stage_latency
 
 SECRET_KEY = "supersecret"
 ALGORITHM = "HS256"
 
-def create_token(user_id: int):
+# Opt-in: embed the user's roles and permission mask in the token so
+# require_permission can authorize without touching the database
+STATELESS_AUTHZ = os.getenv("STATELESS_AUTHZ", "false").lower() in ("1", "true", "yes")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+@dataclass(frozen=True)
+class TokenClaims:
+    """Verified contents of a bearer token"""
+    user_id: int
+    expires_at: int
+    username: str = None
+    role_ids: tuple = ()
+    permission_mask: int = None
+    policy_version: int = None
+    # jti: what revocation refers to
+    token_id: str = None
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        mask = payload.get("prm")
+        return cls(
+            user_id=int(payload.get("sub")),
+            expires_at=int(payload.get("exp")),
+            username=payload.get("name"),
+            role_ids=tuple(payload.get("rol", ())),
+            permission_mask=int(mask, 16) if mask is not None else None,
+            policy_version=payload.get("ver"),
+            token_id=payload.get("jti"),
+        )
+
+class TokenVerifier:
+    """
+    Verifies bearer tokens and remembers the result in a bounded LRU keyed by
+    a SHA-256 of the token, so a token seen recently skips the base64 and HMAC
+    work. Cached entries are dropped once the token's `exp` has passed.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, token: str) -> TokenClaims:
+        """Return the token's claims; raises JWTError, ValueError or TypeError if invalid"""
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is not None:
+                if claims.expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    return claims
+                del self._entries[key]
+
+        claims = TokenClaims.from_payload(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
+        with self._lock:
+            self._entries[key] = claims
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_verifier = TokenVerifier()
+
+def verify_token(token: str) -> TokenClaims:
+    return token_verifier.verify(token)
+
+def permission_claims(principal, policy_version: int) -> dict:
+    """Compact encoding of a principal's authorization state"""
+    return {
+        "name": principal.username,
+        "rol": list(principal.role_ids),
+        "prm": format(principal.mask, "x"),
+        "ver": policy_version,
+    }
+
+def create_token(user_id: int, claims: dict = None):
+    start = time.perf_counter()
     payload = {
         "sub": str(user_id),
-        "exp": datetime.now(timezone.utc) + timedelta(hours=1)
+        "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+        "jti": secrets.token_urlsafe(16),
     }
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    if claims:
+        payload.update(claims)
+    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    stage_latency.observe(("token_create",), time.perf_counter() - start)
+    return token
@@ -12,10 +12,10 @@ def assign_role(
     db: Session = Depends(get_db),
     admin=Depends(require_permission("ADMIN"))
 ):
-    user = db.query(User).get(request.user_id)
+    user = db.get(User, request.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    role = db.query(Role).get(request.role_id)
+    role = db.get(Role, request.role_id)
     if not role:
         raise HTTPException(status_code=404, detail="Role not found")
     if role not in user.roles:
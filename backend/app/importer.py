@@ -0,0 +1,226 @@
+"""
+Bulk import of users, roles, permissions and their assignments.
+
+Each source is a CSV (with a header row) or JSONL file, read as a stream:
+
+    permissions        name
+    roles              name
+    users              username, password
+    role_permissions   role, permission
+    user_roles         username, role
+
+Rows are loaded into temporary staging tables (COPY on PostgreSQL, batched
+executemany elsewhere) and merged with one INSERT ... SELECT ... ON CONFLICT
+DO NOTHING per entity, all in a single transaction. Re-running an import
+therefore changes nothing. Passwords that are already scrypt hashes are
+stored as given; any other value is hashed (on PASSWORD_HASH_WORKERS
+threads) before it is staged, so plaintext never reaches the database. Run
+from the backend directory:
+
+    python -m app.importer --users users.csv --roles roles.csv --user-roles user_roles.jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from sqlalchemy import Column, MetaData, String, Table, select
+from sqlalchemy.engine import Connection
+
+from .models import User, Role, Permission, user_roles, role_permissions
+from .passwords import PASSWORD_HASH_WORKERS, hash_password, is_password_hash
+from .repositories.bulk import BULK_CHUNK_ROWS, check_dialect, dialect_insert
+from .repositories.policy_repository import PolicyRepository
+
+# Import order matters: assignments are resolved against names merged earlier
+ENTITIES = [
+    ("permissions", ("name",)),
+    ("roles", ("name",)),
+    ("users", ("username", "password")),
+    ("role_permissions", ("role", "permission")),
+    ("user_roles", ("username", "role")),
+]
+
+
+def read_records(path: str):
+    """Stream dicts from a .csv or .jsonl/.ndjson file"""
+    with open(path, newline="", encoding="utf-8") as source:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class _CopyStream:
+    """File-like CSV view over a row iterator, consumed lazily by COPY FROM STDIN"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._pending = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self.count += 1
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def _stored_password(password):
+    return password if password is None or is_password_hash(password) else hash_password(password)
+
+
+def _hash_passwords(rows, workers: int = PASSWORD_HASH_WORKERS):
+    """Hash every (username, password) row whose password is not a hash yet, a chunk at a time"""
+    with ThreadPoolExecutor(workers, thread_name_prefix="import-hash") as executor:
+        while True:
+            chunk = list(islice(rows, BULK_CHUNK_ROWS))
+            if not chunk:
+                return
+            passwords = executor.map(_stored_password, [password for _, password in chunk])
+            yield from ((username, password) for (username, _), password in zip(chunk, passwords))
+
+
+def _staging_table(entity: str, columns: tuple) -> Table:
+    return Table(
+        f"import_{entity}",
+        MetaData(),
+        *(Column(column, String) for column in columns),
+        prefixes=["TEMPORARY"],
+    )
+
+
+def _load_staging(connection: Connection, staging: Table, rows) -> int:
+    """Fill a staging table from a row iterator in constant memory"""
+    if connection.dialect.name == "postgresql":
+        stream = _CopyStream(rows)
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {staging.name} FROM STDIN WITH (FORMAT csv)", stream)
+        finally:
+            cursor.close()
+        return stream.count
+
+    count = 0
+    statement = staging.insert()
+    names = [column.name for column in staging.columns]
+    while True:
+        batch = [dict(zip(names, row)) for row in islice(rows, BULK_CHUNK_ROWS)]
+        if not batch:
+            return count
+        connection.execute(statement, batch)
+        count += len(batch)
+
+
+def _merge(connection: Connection, entity: str, staging: Table) -> int:
+    """Move staged rows into the real table, skipping ones that already exist"""
+    dialect = connection.dialect.name
+    c = staging.c
+    # Every SELECT keeps a WHERE clause: SQLite cannot parse
+    # INSERT ... SELECT ... ON CONFLICT without one
+    if entity == "permissions":
+        statement = dialect_insert(dialect, Permission.__table__).from_select(
+            ["name"], select(c.name).where(c.name.is_not(None))
+        )
+    elif entity == "roles":
+        statement = dialect_insert(dialect, Role.__table__).from_select(
+            ["name"], select(c.name).where(c.name.is_not(None))
+        )
+    elif entity == "users":
+        statement = dialect_insert(dialect, User.__table__).from_select(
+            ["username", "password"],
+            select(c.username, c.password).where(c.username.is_not(None), c.password.is_not(None)),
+        )
+    elif entity == "role_permissions":
+        statement = dialect_insert(dialect, role_permissions).from_select(
+            ["role_id", "permission_id"],
+            select(Role.id, Permission.id)
+            .select_from(staging)
+            .join(Role, Role.name == c.role)
+            .join(Permission, Permission.name == c.permission)
+            .where(c.role.is_not(None)),
+        )
+    else:
+        statement = dialect_insert(dialect, user_roles).from_select(
+            ["user_id", "role_id"],
+            select(User.id, Role.id)
+            .select_from(staging)
+            .join(User, User.username == c.username)
+            .join(Role, Role.name == c.role)
+            .where(c.username.is_not(None)),
+        )
+    return connection.execute(statement.on_conflict_do_nothing()).rowcount
+
+
+def run_import(engine, sources: dict, report=print) -> dict:
+    """
+    Import every entity named in `sources` ({entity: path}) in one transaction.
+    Returns {entity: {"read", "inserted", "seconds", "rows_per_sec"}}.
+    """
+    check_dialect(engine.dialect.name)
+    summary = {}
+    with engine.begin() as connection:
+        for entity, columns in ENTITIES:
+            path = sources.get(entity)
+            if not path:
+                continue
+            start = time.perf_counter()
+            staging = _staging_table(entity, columns)
+            staging.create(connection)
+            rows = (tuple(record.get(column) for column in columns) for record in read_records(path))
+            if entity == "users":
+                rows = _hash_passwords(rows)
+            read = _load_staging(connection, staging, rows)
+            inserted = _merge(connection, entity, staging)
+            staging.drop(connection)
+            seconds = time.perf_counter() - start
+            summary[entity] = {
+                "read": read,
+                "inserted": inserted,
+                "seconds": round(seconds, 3),
+                "rows_per_sec": round(read / seconds) if seconds else read,
+            }
+            report(
+                f"{entity}: {read} rows read, {inserted} new, "
+                f"{summary[entity]['rows_per_sec']} rows/sec"
+            )
+        if any(summary.get(entity, {}).get("inserted") for entity in ("role_permissions", "user_roles")):
+            # Running servers drop their cached permissions on their next poll
+            PolicyRepository(connection).record_change()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream users, roles, permissions and assignments into the database")
+    for entity, columns in ENTITIES:
+        parser.add_argument(
+            "--" + entity.replace("_", "-"),
+            dest=entity,
+            metavar="PATH",
+            help=f"CSV or JSONL file with columns: {', '.join(columns)}",
+        )
+    args = parser.parse_args(argv)
+
+    from .database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    run_import(engine, {entity: getattr(args, entity) for entity, _ in ENTITIES})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Dump roles, users, permissions and role assignments for inspection.
+
+Rows are streamed from the database in batches of --batch-size (a named
+server-side cursor on PostgreSQL) and written out one by one as NDJSON or
+CSV, so memory use stays flat however large the tables are. Uses the
+DATABASE_URL of the application. Run from the backend directory:
+
+    python -m app.inspector user-roles --role Admin
+    python -m app.inspector users --format csv --output users.csv
+"""
+import argparse
+import csv
+import json
+import sys
+
+from sqlalchemy import select
+
+from .models import User, Role, Permission, user_roles, role_permissions
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _matches(column_id, column_name, value: str):
+    """Filter on the id if `value` is numeric, otherwise on the name"""
+    return column_id == int(value) if value.isdigit() else column_name == value
+
+
+def build_query(table: str, user: str = None, role: str = None):
+    """SELECT for one dump, ordered by id; `user` and `role` are ids or names"""
+    if table == "roles":
+        query = select(Role.id, Role.name).order_by(Role.id)
+        if role:
+            query = query.where(_matches(Role.id, Role.name, role))
+        if user:
+            query = (
+                query.join(user_roles, user_roles.c.role_id == Role.id)
+                .join(User, User.id == user_roles.c.user_id)
+                .where(_matches(User.id, User.username, user))
+            )
+        return query
+
+    if table == "users":
+        query = select(User.id, User.username).order_by(User.id)
+        if user:
+            query = query.where(_matches(User.id, User.username, user))
+        if role:
+            query = (
+                query.join(user_roles, user_roles.c.user_id == User.id)
+                .join(Role, Role.id == user_roles.c.role_id)
+                .where(_matches(Role.id, Role.name, role))
+            )
+        return query
+
+    if table == "user-roles":
+        query = (
+            select(
+                User.id.label("user_id"),
+                User.username,
+                Role.id.label("role_id"),
+                Role.name.label("role_name"),
+            )
+            .outerjoin(user_roles, user_roles.c.user_id == User.id)
+            .outerjoin(Role, Role.id == user_roles.c.role_id)
+            .order_by(User.id, Role.id)
+        )
+        if user:
+            query = query.where(_matches(User.id, User.username, user))
+        if role:
+            query = query.where(_matches(Role.id, Role.name, role))
+        return query
+
+    if table == "permissions":
+        if user:
+            raise ValueError("permissions can only be filtered by role")
+        query = select(Permission.id, Permission.name).order_by(Permission.id)
+        if role:
+            query = (
+                query.join(role_permissions, role_permissions.c.permission_id == Permission.id)
+                .join(Role, Role.id == role_permissions.c.role_id)
+                .where(_matches(Role.id, Role.name, role))
+            )
+        return query
+
+    raise ValueError(f"Unknown table {table!r}")
+
+
+def stream_rows(engine, query, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Yield the query's rows, holding at most one batch in memory"""
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        yield from result
+
+
+def write_rows(rows, columns, out, output_format: str = "ndjson") -> int:
+    """Write each row as it arrives; returns how many were written"""
+    count = 0
+    if output_format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(dict(zip(columns, row))) + "\n")
+            count += 1
+    return count
+
+
+def dump(engine, table: str, out, output_format: str = "ndjson", user: str = None, role: str = None,
+         batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    query = build_query(table, user, role)
+    columns = [column.name for column in query.selected_columns]
+    return write_rows(stream_rows(engine, query, batch_size), columns, out, output_format)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream roles, users, permissions or assignments as NDJSON or CSV")
+    parser.add_argument("table", choices=["roles", "users", "user-roles", "permissions"])
+    parser.add_argument("--user", help="only this user (id or username)")
+    parser.add_argument("--role", help="only this role (id or name)")
+    parser.add_argument("--format", dest="output_format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--output", help="file to write instead of stdout")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows fetched per round trip")
+    args = parser.parse_args(argv)
+
+    from .database import engine
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        dump(engine, args.table, out, args.output_format, args.user, args.role, args.batch_size)
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Low-overhead counters and histograms rendered in the Prometheus text format.
+
+Every thread records into its own shard (a plain dict reached through a
+threading.local), so the request path never takes a lock; the shards are
+only merged when /metrics is scraped. Shards of finished threads are kept,
+so their counts are not lost.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "securegate")
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            shard = self._local.values = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshots(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict() copies under the GIL, so a shard being written is read consistently
+        return [dict(shard) for shard in shards]
+
+    def clear(self):
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def _labels(self, values, le: str = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if le is not None:
+            pairs.append(f'le="{le}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self) -> dict:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render(self):
+        for labels, value in sorted(self.collect().items()):
+            yield f"{self.name}{self._labels(labels)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: tuple, value: float):
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # Per-bucket counts (not cumulative), then the +Inf bucket, sum and count
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def collect(self) -> dict:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, series in shard.items():
+                merged = totals.setdefault(labels, [0] * len(series))
+                for index, value in enumerate(list(series)):
+                    merged[index] += value
+        return totals
+
+    def render(self):
+        for labels, series in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                yield f"{self.name}_bucket{self._labels(labels, le)} {cumulative}"
+            yield f"{self.name}_sum{self._labels(labels)} {_number(series[-2])}"
+            yield f"{self.name}_count{self._labels(labels)} {series[-1]}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = []
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+auth_failures = Counter("auth_failures_total", "Rejected authentications by reason", ("reason",))
+authz_decisions = Counter(
+    "authz_decisions_total", "require_permission decisions by principal source", ("source", "result")
+)
+stage_latency = Histogram(
+    "stage_duration_seconds",
+    "Hot-path stages: jwt_decode, token_create, load_principal, authorize, db_session",
+    ("stage",),
+)
+db_queries = Counter("db_queries_total", "SQL statements executed", ("engine",))
+db_time_per_request = Histogram("db_seconds_per_request", "Time spent in SQL statements per request", ("route",))
+
+# [seconds] accumulated by SQL statements of the current request; shared with
+# threadpool workers because they run in a copy of the request's context
+_request_db_time = ContextVar("request_db_time", default=None)
+
+
+def start_request_db_timer():
+    return _request_db_time.set([0.0])
+
+
+def finish_request_db_timer(token) -> float:
+    spent = _request_db_time.get()
+    _request_db_time.reset(token)
+    return spent[0] if spent else 0.0
+
+
+def track_db_time(engine, name: str):
+    """Count statements on `engine` and add their duration to the current request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+        db_queries.inc((name,))
+        spent = _request_db_time.get()
+        if spent is not None:
+            spent[0] += elapsed
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,20 +1,40 @@
+import re
+import time
+from contextlib import asynccontextmanager, contextmanager
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse
-from .database import SessionLocal, get_db
+from .database import ASYNC_DB, get_async_db, get_db
 from .models import User
-from .auth import SECRET_KEY, ALGORITHM
+from .auth import TokenClaims, verify_token
+from .metrics import (
+    auth_failures,
+    authz_decisions,
+    db_time_per_request,
+    finish_request_db_timer,
+    http_latency,
+    http_requests,
+    stage_latency,
+    start_request_db_timer,
+)
+from .permission_cache import Principal, permission_cache
+from .permission_engine import permission_engine
+from .policy_snapshot import policy_store
+from .repositories.user_repository import UserRepository
+from .revocation import RevocationCheckFailed, revocation_list
+from .services.audit_service import PERMISSION_DENIED, audit_log
+from .services.policy_sync_service import policy_watcher
 
 security = HTTPBearer()
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     """Extract and validate user from JWT token"""
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload.get("sub"))
+        user_id = verify_token(credentials.credentials).user_id
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
@@ -22,79 +42,317 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except (JWTError, ValueError, TypeError):
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def require_permission(permission_name: str):
-    """Dependency to check if user has a specific permission"""
-    def checker(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def load_principal(db: Session, user_id: int):
+    """Resolve a user and its role ids in one query and fold them into a permission mask"""
+    found = UserRepository(db).get_username_and_role_ids(user_id)
+    if found is None:
+        return None
+    username, role_ids = found
+    mask = permission_engine.user_mask(db, role_ids)
+    return Principal(
+        id=user_id,
+        username=username,
+        mask=mask,
+        version=permission_engine.version,
+        role_ids=tuple(role_ids),
+        patterns=permission_engine.patterns_for_mask(mask),
+    )
+
+async def load_principal_async(db: AsyncSession, user_id: int):
+    """Async counterpart of load_principal, running the same queries over the async connection"""
+    return await db.run_sync(load_principal, user_id)
+
+def principal_from_claims(claims: TokenClaims):
+    """Trust the permission claims of a token issued against the current policy version"""
+    if claims.permission_mask is None or claims.policy_version != permission_engine.policy_version:
+        return None
+    return Principal(
+        id=claims.user_id,
+        username=claims.username,
+        mask=claims.permission_mask,
+        version=permission_engine.version,
+        role_ids=claims.role_ids,
+        patterns=permission_engine.patterns_for_mask(claims.permission_mask),
+    )
+
+def _verified_claims(token: str) -> TokenClaims:
+    try:
+        return verify_token(token)
+    except (JWTError, ValueError, TypeError):
+        auth_failures.inc(("invalid_token",))
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+def _revoked():
+    auth_failures.inc(("revoked_token",))
+    return HTTPException(status_code=401, detail="Token has been revoked")
+
+# Fail closed: a token whose revocation cannot be checked is refused, with a
+# 503 rather than a 401 since the token itself may well be valid
+REVOCATION_UNAVAILABLE = "Token revocation check unavailable, please retry"
+
+def _revocation_unavailable():
+    auth_failures.inc(("revocation_unavailable",))
+    return HTTPException(status_code=503, detail=REVOCATION_UNAVAILABLE, headers={"Retry-After": "1"})
+
+def request_claims(request: Request, token: str) -> TokenClaims:
+    """Claims verified by AuthorizationMiddleware, or verify the token here if it did not run"""
+    claims = getattr(request.state, "claims", None)
+    if claims is None:
+        claims = _verified_claims(token)
         try:
-            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = int(payload.get("sub"))
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                raise HTTPException(status_code=401, detail="User not found")
-        except (JWTError, ValueError, TypeError):
-            raise HTTPException(status_code=401, detail="Invalid token")
+            revoked = revocation_list.might_be_revoked(claims) and revocation_list.is_revoked(claims)
+        except RevocationCheckFailed:
+            raise _revocation_unavailable()
+        if revoked:
+            raise _revoked()
+        request.state.claims = claims
+    return claims
 
-        permissions = {
-            p.name
-            for role in user.roles
-            for p in role.permissions
-        }
+async def request_claims_async(request: Request, token: str) -> TokenClaims:
+    """request_claims, reading revoked tokens off the event loop"""
+    claims = getattr(request.state, "claims", None)
+    if claims is None:
+        claims = _verified_claims(token)
+        try:
+            revoked = revocation_list.might_be_revoked(claims) and await run_in_threadpool(revocation_list.is_revoked, claims)
+        except RevocationCheckFailed:
+            raise _revocation_unavailable()
+        if revoked:
+            raise _revoked()
+        request.state.claims = claims
+    return claims
+
+@contextmanager
+def open_db(request: Request):
+    """Open a session through get_db (or its test override) only when one is needed"""
+    provider = request.app.dependency_overrides.get(get_db, get_db)
+    sessions = provider()
+    start = time.perf_counter()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
+        stage_latency.observe(("load_principal",), time.perf_counter() - start)
 
-        if permission_name not in permissions:
+@asynccontextmanager
+async def open_async_db(request: Request):
+    """Async counterpart of open_db, going through get_async_db"""
+    provider = request.app.dependency_overrides.get(get_async_db, get_async_db)
+    sessions = provider()
+    start = time.perf_counter()
+    try:
+        yield await sessions.__anext__()
+    finally:
+        await sessions.aclose()
+        stage_latency.observe(("load_principal",), time.perf_counter() - start)
+
+def _denied_detail(names, require_all: bool) -> str:
+    if len(names) == 1:
+        return f"Permission '{next(iter(names))}' required"
+    listed = ", ".join(f"'{name}'" for name in sorted(names))
+    if require_all:
+        return f"Permissions {listed} required"
+    return f"One of permissions {listed} required"
+
+class _Requirement:
+    """The permission test shared by the sync and async checkers"""
+
+    def __init__(self, permission_name, match: str):
+        if match not in ("all", "any"):
+            raise ValueError(f"match must be 'all' or 'any', not {match!r}")
+        self.names = frozenset([permission_name] if isinstance(permission_name, str) else permission_name)
+        self.require_all = match == "all"
+        self.has_permission = permission_engine.has_all if self.require_all else permission_engine.has_any
+        self.detail = _denied_detail(self.names, self.require_all)
+        # (engine version, mask, ((name, bit), ...)) compiled lazily since bit
+        # positions are only known once the engine has loaded
+        self.compiled = (None, 0, ())
+
+    @staticmethod
+    def known_principal(claims: TokenClaims):
+        """(principal, source) from the token claims, the policy snapshot or the cache, if any is current"""
+        user = principal_from_claims(claims)
+        if user is not None:
+            return user, "claims"
+        user = policy_store.principal(claims.user_id)
+        if user is not None:
+            return user, "snapshot"
+        user = permission_cache.get(claims.user_id)
+        if user is not None and user.version == permission_engine.version:
+            return user, "cache"
+        return None, "db"
+
+    @staticmethod
+    def remember(user, generation: int):
+        if not user:
+            auth_failures.inc(("user_not_found",))
+            raise HTTPException(status_code=401, detail="User not found")
+        permission_cache.put(user, generation)
+        return user
+
+    def authorize(self, user, source: str):
+        start = time.perf_counter()
+        version, required, name_bits = self.compiled
+        if version != permission_engine.version:
+            required = permission_engine.compile(self.names)
+            name_bits = tuple((name, permission_engine.compile([name])) for name in self.names)
+            self.compiled = (permission_engine.version, required, name_bits)
+
+        allowed = self.has_permission(user.mask, required)
+        if not allowed and user.patterns is not None:
+            # Names the mask lacks may still be granted by a wildcard pattern
+            matched = (user.patterns.matches(name) for name, bit in name_bits if not user.mask & bit)
+            allowed = all(matched) if self.require_all else any(matched)
+        stage_latency.observe(("authorize",), time.perf_counter() - start)
+        authz_decisions.inc((source, "allowed" if allowed else "denied"))
+        if not allowed:
+            audit_log.record(PERMISSION_DENIED, user.id, user.username, detail=self.detail)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Permission '{permission_name}' required"
+                detail=self.detail
             )
 
         return user
 
-    return checker
+def require_permission(permission_name, match: str = "all"):
+    """
+    Dependency to check if user has a specific permission.
+    `permission_name` may also be a collection of names, in which case
+    `match` selects whether all of them ("all") or any of them ("any") are needed.
+    With ASYNC_DB enabled the returned checker is a coroutine using get_async_db.
+    """
+    requirement = _Requirement(permission_name, match)
 
-class AuthorizationMiddleware(BaseHTTPMiddleware):
+    def checker(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+        policy_watcher.poll()
+        claims = request_claims(request, credentials.credentials)
+        user, source = requirement.known_principal(claims)
+        if user is None:
+            generation = permission_cache.generation
+            with open_db(request) as db:
+                user = requirement.remember(load_principal(db, claims.user_id), generation)
+        return requirement.authorize(user, source)
+
+    async def async_checker(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+        if policy_watcher.due():
+            await run_in_threadpool(policy_watcher.poll)
+        claims = await request_claims_async(request, credentials.credentials)
+        user, source = requirement.known_principal(claims)
+        if user is None:
+            generation = permission_cache.generation
+            async with open_async_db(request) as db:
+                user = requirement.remember(await load_principal_async(db, claims.user_id), generation)
+        return requirement.authorize(user, source)
+
+    return async_checker if ASYNC_DB else checker
+
+class AuthorizationMiddleware:
+    """
+    Custom ASGI middleware to validate JWT tokens for protected routes.
+    Routes that start with /resource, /admin or /authz require authentication.
+    Written against raw ASGI so unprotected requests pass straight through
+    without the task and stream wrapping of BaseHTTPMiddleware.
+    """
+
+    PROTECTED_PREFIXES = ["/resource", "/admin", "/authz"]
+
+    def __init__(self, app, protected_prefixes=None):
+        self.app = app
+        prefixes = protected_prefixes or self.PROTECTED_PREFIXES
+        # One precompiled alternation instead of a startswith() per prefix
+        self._is_protected = re.compile("|".join(re.escape(prefix) for prefix in prefixes)).match
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._is_protected(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
+
+        if not auth_header:
+            await self._reject("missing_header", "Missing authorization header", scope, receive, send)
+            return
+
+        # Extract token
+        try:
+            scheme, token = auth_header.split()
+            if scheme.lower() != "bearer":
+                raise ValueError("Invalid auth scheme")
+        except ValueError:
+            await self._reject("malformed_header", "Invalid authorization header format", scope, receive, send)
+            return
+
+        # Validate token once; dependencies read the claims from request state
+        start = time.perf_counter()
+        try:
+            claims = verify_token(token)
+        except (JWTError, ValueError, TypeError):
+            await self._reject("invalid_token", "Invalid or expired token", scope, receive, send)
+            return
+        finally:
+            stage_latency.observe(("jwt_decode",), time.perf_counter() - start)
+
+        # Almost always settled by the in-memory filter; only its hits read the database
+        try:
+            revoked = revocation_list.might_be_revoked(claims) and await run_in_threadpool(revocation_list.is_revoked, claims)
+        except RevocationCheckFailed:
+            await self._reject(
+                "revocation_unavailable", REVOCATION_UNAVAILABLE, scope, receive, send,
+                status_code=503, headers={"Retry-After": "1"},
+            )
+            return
+        if revoked:
+            await self._reject("revoked_token", "Token has been revoked", scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        state["claims"] = claims
+        state["user_id"] = claims.user_id
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(reason: str, detail: str, scope, receive, send, status_code: int = 401, headers: dict = None):
+        auth_failures.inc((reason,))
+        response = JSONResponse(status_code=status_code, content={"detail": detail}, headers=headers)
+        await response(scope, receive, send)
+
+class MetricsMiddleware:
     """
-    Custom middleware to validate JWT tokens for protected routes.
-    Routes that start with /resource or /admin require authentication.
+    ASGI middleware recording request counts, latency and the time spent in
+    SQL per route. Routes are labelled by their path template, so the number
+    of series stays bounded; requests that never reach a route are "unmatched".
     """
-    
-    PROTECTED_PREFIXES = ["/resource", "/admin"]
-    
-    async def dispatch(self, request: Request, call_next):
-        # Check if route requires authentication
-        path = request.url.path
-        
-        if any(path.startswith(prefix) for prefix in self.PROTECTED_PREFIXES):
-            auth_header = request.headers.get("Authorization")
-            
-            if not auth_header:
-                return JSONResponse(
-                    status_code=401,
-                    content={"detail": "Missing authorization header"}
-                )
-            
-            # Extract token
-            try:
-                scheme, token = auth_header.split()
-                if scheme.lower() != "bearer":
-                    raise ValueError("Invalid auth scheme")
-            except ValueError:
-                return JSONResponse(
-                    status_code=401,
-                    content={"detail": "Invalid authorization header format"}
-                )
-            
-            # Validate token
-            try:
-                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-                user_id = int(payload.get("sub"))
-                
-                # Store user_id in request state for later use
-                request.state.user_id = user_id
-            except (JWTError, ValueError):
-                return JSONResponse(
-                    status_code=401,
-                    content={"detail": "Invalid or expired token"}
-                )
-        
-        response = await call_next(request)
-        return response
 
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = start_request_db_timer()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            db_seconds = finish_request_db_timer(token)
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            http_requests.inc((scope["method"], path, str(status_code)))
+            http_latency.observe((scope["method"], path), elapsed)
+            db_time_per_request.observe((path,), db_seconds)
@@ -1,19 +1,31 @@
-from sqlalchemy import Table, Column, Integer, String, ForeignKey
+from sqlalchemy import Table, Column, DateTime, Index, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
 from .database import Base
 
+# Composite primary keys (as created by setup_db.py) index the
+# user -> role -> permission joins used by permission checks
 user_roles = Table(
     "user_roles",
     Base.metadata,
-    Column("user_id", ForeignKey("users.id")),
-    Column("role_id", ForeignKey("roles.id"))
+    Column("user_id", ForeignKey("users.id"), primary_key=True),
+    Column("role_id", ForeignKey("roles.id"), primary_key=True),
+    # The reverse direction, for listing the users of a role in id order
+    Index("ix_user_roles_role_id_user_id", "role_id", "user_id"),
 )
 
 role_permissions = Table(
     "role_permissions",
     Base.metadata,
-    Column("role_id", ForeignKey("roles.id")),
-    Column("permission_id", ForeignKey("permissions.id"))
+    Column("role_id", ForeignKey("roles.id"), primary_key=True),
+    Column("permission_id", ForeignKey("permissions.id"), primary_key=True)
+)
+
+# parent_id inherits every permission of child_id, e.g. Admin -> Editor -> Viewer
+role_hierarchy = Table(
+    "role_hierarchy",
+    Base.metadata,
+    Column("parent_id", ForeignKey("roles.id"), primary_key=True),
+    Column("child_id", ForeignKey("roles.id"), primary_key=True)
 )
 
 class User(Base):
@@ -27,12 +39,57 @@ class User(Base):
 class Role(Base):
     __tablename__ = "roles"
     id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, unique=True)
 
     users = relationship("User", secondary=user_roles, back_populates="roles")
     permissions = relationship("Permission", secondary=role_permissions)
+    children = relationship(
+        "Role",
+        secondary=role_hierarchy,
+        primaryjoin=lambda: Role.id == role_hierarchy.c.parent_id,
+        secondaryjoin=lambda: Role.id == role_hierarchy.c.child_id,
+        backref="parents",
+    )
 
 class Permission(Base):
     __tablename__ = "permissions"
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
+
+class AuditEvent(Base):
+    """Append-only trail of logins, denied permission checks and role changes"""
+    __tablename__ = "audit_events"
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    event = Column(String, nullable=False, index=True)
+    actor_id = Column(Integer)
+    actor_name = Column(String)
+    subject_id = Column(Integer)
+    detail = Column(String)
+
+class PolicyVersion(Base):
+    """Single-row counter bumped in the same transaction as every policy change"""
+    __tablename__ = "policy_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+class PolicyChange(Base):
+    """
+    Which users a policy version changed, so other workers invalidate only
+    them. A row without user_id changed roles or permissions for everyone;
+    one without role_id revoked a token of the user.
+    """
+    __tablename__ = "policy_changes"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer)
+    role_id = Column(Integer)
+
+class RevokedToken(Base):
+    """Token ids (jti) rejected before their expiry; rows are purged once the token would have expired"""
+    __tablename__ = "revoked_tokens"
+    id = Column(Integer, primary_key=True)
+    jti = Column(String, unique=True, nullable=False)
+    user_id = Column(Integer)
+    # Unix time of the token's own exp claim
+    expires_at = Column(Integer, nullable=False, index=True)
@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# scrypt cost parameters for new hashes; stored hashes with other parameters
+# are re-hashed on the next successful login
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Hashing jobs allowed to wait or run at once before logins are turned away
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+
+_SCHEME = "scrypt"
+
+
+class PasswordPoolFull(Exception):
+    """Raised when the hashing pool already holds its maximum number of jobs"""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=32)
+
+
+def hash_password(password: str) -> str:
+    """Hash with the current parameters as scrypt$n$r$p$salt$hash"""
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{_SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def _parse_hash(stored: str):
+    """(n, r, p, salt, digest) of a scrypt$n$r$p$salt$hash string; ValueError if malformed"""
+    scheme, n, r, p, salt, digest = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    salt, digest = base64.b64decode(salt, validate=True), base64.b64decode(digest, validate=True)
+    if scheme != _SCHEME or n < 2 or n & (n - 1) or r < 1 or p < 1 or len(digest) != 32:
+        raise ValueError("Malformed scrypt hash")
+    return n, r, p, salt, digest
+
+
+def is_password_hash(stored: str) -> bool:
+    """Whether `stored` is a well-formed hash as written by hash_password"""
+    try:
+        _parse_hash(stored)
+    except (ValueError, binascii.Error):
+        return False
+    return True
+
+
+def check_password(password: str, stored: str):
+    """
+    Verify a password against its stored value.
+    Returns (matches, upgraded_hash). `upgraded_hash` is set when the stored
+    value is a legacy plaintext password or uses outdated parameters, and
+    should replace it.
+    """
+    if not stored:
+        return False, None
+
+    if not stored.startswith(_SCHEME + "$"):
+        # Plaintext row from before hashing was introduced
+        matches = hmac.compare_digest(password.encode(), stored.encode())
+        return matches, hash_password(password) if matches else None
+
+    try:
+        n, r, p, salt, digest = _parse_hash(stored)
+        computed = _scrypt(password, salt, n, r, p)
+    except (ValueError, OverflowError, binascii.Error):
+        # Truncated hash, or a legacy plaintext password that looks like one
+        logger.warning("Malformed scrypt hash in stored password, rejecting login")
+        return False, None
+    matches = hmac.compare_digest(computed, digest)
+    if matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P):
+        return True, hash_password(password)
+    return matches, None
+
+
+class PasswordPool:
+    """
+    Runs password hashing on a dedicated, size-bounded thread pool.
+    hashlib.scrypt releases the GIL, so the workers use real CPU parallelism
+    without blocking the event loop or Starlette's threadpool. Once
+    `queue_limit` jobs are pending, new ones are rejected immediately with
+    PasswordPoolFull instead of queueing behind a login storm.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_limit: int = PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.rejected = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        # Verified against when the user does not exist, so unknown
+        # usernames cost as much as wrong passwords
+        self._dummy_hash = None
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self.rejected += 1
+                raise PasswordPoolFull()
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _check_job(self, password: str, stored: str):
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = hash_password(secrets.token_hex(16))
+            check_password(password, self._dummy_hash)
+            return False, None
+        return check_password(password, stored)
+
+    def verify(self, password: str, stored: str):
+        """Blocking check_password() on the pool; `stored` is None for unknown users"""
+        return self.submit(self._check_job, password, stored).result()
+
+    async def verify_async(self, password: str, stored: str):
+        return await asyncio.wrap_future(self.submit(self._check_job, password, stored))
+
+    def hash(self, password: str) -> str:
+        return self.submit(hash_password, password).result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(hash_password, password))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "pending": self._pending,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_pool = PasswordPool()
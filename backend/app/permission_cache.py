@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", "10000"))
+PERMISSION_CACHE_TTL = float(os.getenv("PERMISSION_CACHE_TTL", "60"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated user together with its effective permission mask"""
+    id: int
+    username: str
+    mask: int
+    # Permission engine version the mask's bit positions refer to
+    version: int = 0
+    role_ids: tuple = ()
+    # PatternTrie of granted wildcard permissions, None if there are none
+    patterns: object = field(default=None, compare=False, repr=False)
+
+
+class PermissionCache:
+    """
+    In-process LRU of effective permission masks keyed by user id.
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `maxsize` is reached.
+    """
+
+    def __init__(self, maxsize: int = PERMISSION_CACHE_SIZE, ttl: float = PERMISSION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation; pass it back to put() to drop racing loads"""
+        return self._generation
+
+    def get(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, principal = entry
+                if expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return principal
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, principal: Principal, generation: int = None):
+        with self._lock:
+            # An invalidation happened while the caller was loading from the
+            # database, so what it read may already be stale
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def invalidate_many(self, user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+permission_cache = PermissionCache()
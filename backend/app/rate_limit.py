@@ -0,0 +1,181 @@
+"""
+In-process token-bucket rate limiting for the login route.
+
+Buckets live in SHARDS independently locked shards chosen by key hash, so
+concurrent logins rarely contend. Each shard stores its buckets in two
+preallocated float arrays (tokens, last refill) indexed through a
+key -> slot dict, with freed slots reused, instead of one object per key.
+Buckets idle long enough to have refilled completely are indistinguishable
+from new ones, and are evicted by a sweep every `sweep_interval` seconds.
+"""
+import ipaddress
+import os
+import threading
+import time
+from array import array
+from fastapi import HTTPException, Request
+from .metrics import auth_failures
+
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "true").lower() in ("1", "true", "yes")
+# Attempts allowed in a burst, and refilled per minute, per username and per client IP
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "10"))
+LOGIN_USER_PER_MINUTE = float(os.getenv("LOGIN_USER_PER_MINUTE", "10"))
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "30"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "60"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "64"))
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+# Longest Retry-After sent; a bucket that never refills (a rate of 0) waits forever
+MAX_RETRY_AFTER_SECONDS = 86400
+# Comma-separated addresses or networks of reverse proxies whose
+# X-Forwarded-For is believed, e.g. "10.0.0.0/8,127.0.0.1". Without it every
+# client behind the proxy would share the proxy's per-IP bucket.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("TRUSTED_PROXIES", "").split(",")
+    if entry.strip()
+]
+
+
+class _Shard:
+    __slots__ = ("lock", "slots", "tokens", "updated", "free", "next_sweep")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.tokens = array("d")
+        self.updated = array("d")
+        self.free = []
+        self.next_sweep = 0.0
+
+
+class TokenBuckets:
+    """One token bucket per key: `burst` tokens, refilled at `per_second`"""
+
+    def __init__(self, burst: int, per_second: float, shards: int = RATE_LIMIT_SHARDS, sweep_interval: float = RATE_LIMIT_SWEEP_SECONDS):
+        self.burst = float(burst)
+        self.per_second = per_second
+        self.sweep_interval = sweep_interval
+        # Time an idle bucket needs to refill completely
+        self.idle_after = self.burst / per_second if per_second > 0 else float("inf")
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def acquire(self, key, now: float = None) -> float:
+        """Take one token. Returns 0 if allowed, otherwise seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        shard = self._shards[hash(key) % len(self._shards)]
+        with shard.lock:
+            if now >= shard.next_sweep:
+                self._sweep(shard, now)
+            slot = shard.slots.get(key)
+            if slot is None:
+                slot = self._allocate(shard, key, now)
+            tokens = min(self.burst, shard.tokens[slot] + (now - shard.updated[slot]) * self.per_second)
+            shard.updated[slot] = now
+            if tokens >= 1:
+                shard.tokens[slot] = tokens - 1
+                return 0.0
+            shard.tokens[slot] = tokens
+            return (1 - tokens) / self.per_second if self.per_second > 0 else float("inf")
+
+    def _allocate(self, shard: _Shard, key, now: float) -> int:
+        if shard.free:
+            slot = shard.free.pop()
+            shard.tokens[slot] = self.burst
+            shard.updated[slot] = now
+        else:
+            slot = len(shard.tokens)
+            shard.tokens.append(self.burst)
+            shard.updated.append(now)
+        shard.slots[key] = slot
+        return slot
+
+    def _sweep(self, shard: _Shard, now: float):
+        idle = [key for key, slot in shard.slots.items() if now - shard.updated[slot] >= self.idle_after]
+        for key in idle:
+            shard.free.append(shard.slots.pop(key))
+        shard.next_sweep = now + self.sweep_interval
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.slots.clear()
+                shard.free.clear()
+                del shard.tokens[:]
+                del shard.updated[:]
+
+    def __len__(self):
+        return sum(len(shard.slots) for shard in self._shards)
+
+
+class LoginRateLimiter:
+    """Login attempts are limited per client IP and per username"""
+
+    def __init__(self):
+        self.by_ip = TokenBuckets(LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60)
+        self.by_username = TokenBuckets(LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE / 60)
+
+    def acquire(self, client_ip: str, username) -> float:
+        wait = self.by_ip.acquire(client_ip)
+        if not wait and isinstance(username, str):
+            wait = self.by_username.acquire(username.lower())
+        return wait
+
+    def clear(self):
+        self.by_ip.clear()
+        self.by_username.clear()
+
+    def stats(self) -> dict:
+        return {"ip_buckets": len(self.by_ip), "username_buckets": len(self.by_username)}
+
+
+login_rate_limiter = LoginRateLimiter()
+
+
+def _trusted(address: str, proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_ip(request: Request, proxies=None) -> str:
+    """
+    Address of the client: the peer, unless it is a trusted proxy, in which
+    case the right-most X-Forwarded-For entry not added by a trusted proxy.
+    """
+    proxies = TRUSTED_PROXIES if proxies is None else proxies
+    address = request.client.host if request.client else "unknown"
+    if not proxies or not _trusted(address, proxies):
+        return address
+    for hop in reversed(request.headers.get("x-forwarded-for", "").split(",")):
+        hop = hop.strip()
+        if not hop:
+            continue
+        address = hop
+        if not _trusted(hop, proxies):
+            break
+    return address
+
+
+async def limit_login_attempts(request: Request):
+    """
+    Dependency rejecting throttled logins with 429. Declare it before the
+    database session so rejected attempts never open one; the JSON body has
+    already been read and parsed by then, so reading it again is free.
+    """
+    if not LOGIN_RATE_LIMIT:
+        return
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    username = body.get("username") if isinstance(body, dict) else None
+    wait = login_rate_limiter.acquire(client_ip(request), username)
+    if wait:
+        auth_failures.inc(("rate_limited",))
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts, please retry later",
+            headers={"Retry-After": str(max(1, round(min(wait, MAX_RETRY_AFTER_SECONDS))))},
+        )
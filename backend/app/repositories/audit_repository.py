@@ -0,0 +1,13 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from ..models import AuditEvent
+from .bulk import chunked
+
+class AuditRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add_events(self, events: list):
+        """Insert a batch of event dicts with executemany. Does not commit."""
+        for chunk in chunked(events):
+            self.db.execute(insert(AuditEvent), chunk)
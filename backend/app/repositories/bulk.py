@@ -0,0 +1,32 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+# Rows per multi-row INSERT; keeps bind parameters under the PostgreSQL
+# (65535) and SQLite (32766) limits for narrow tables
+BULK_CHUNK_ROWS = 5000
+
+# Role assignment, imports, revocation and the policy version all rely on
+# INSERT ... ON CONFLICT DO NOTHING, which these dialects provide
+SUPPORTED_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def check_dialect(dialect_name: str):
+    """Refuse to run against a database the bulk writes cannot target"""
+    if dialect_name not in SUPPORTED_DIALECTS:
+        raise RuntimeError(
+            f"SecureGate supports PostgreSQL and SQLite; {dialect_name} has no INSERT ... ON CONFLICT DO NOTHING. "
+            "Point DATABASE_URL at a supported database."
+        )
+
+def dialect_insert(dialect_name: str, table):
+    """insert() construct supporting on_conflict_do_nothing() for the dialect"""
+    check_dialect(dialect_name)
+    return SUPPORTED_DIALECTS[dialect_name](table)
+
+def insert_ignoring_conflicts(db, table, rows: list):
+    """INSERT ... ON CONFLICT DO NOTHING for the dialect of a Session or Connection"""
+    dialect = db.get_bind().dialect if isinstance(db, Session) else db.dialect
+    return dialect_insert(dialect.name, table).values(rows).on_conflict_do_nothing()
+
+def chunked(items: list, size: int = BULK_CHUNK_ROWS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,71 @@
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from ..models import Permission, user_roles, role_hierarchy, role_permissions
+from ..permission_patterns import ANY_SEGMENT, PatternTrie
+
+class PermissionRepository:
+    """
+    Permission lookups pushed down to SQL.
+    Both queries expand the user's roles through role_hierarchy with a
+    recursive CTE, join role_permissions -> permissions on their primary keys
+    and return plain rows, so no ORM objects are loaded.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _granted(user_id: int):
+        roles = (
+            select(user_roles.c.role_id.label("role_id"))
+            .where(user_roles.c.user_id == user_id)
+            .cte("granted_roles", recursive=True)
+        )
+        # UNION (not UNION ALL) stops at roles already seen, even on a cycle
+        roles = roles.union(
+            select(role_hierarchy.c.child_id).join(roles, role_hierarchy.c.parent_id == roles.c.role_id)
+        )
+        return (
+            select(Permission.id, Permission.name)
+            .join(role_permissions, role_permissions.c.permission_id == Permission.id)
+            .join(roles, roles.c.role_id == role_permissions.c.role_id)
+        )
+
+    def has_permission(self, user_id: int, permission_name: str) -> bool:
+        """
+        Whether the user holds the permission, by name or through a wildcard
+        pattern. One query returns the exact grant and any granted patterns.
+        """
+        names = self.db.execute(
+            self._granted(user_id)
+            .with_only_columns(Permission.name)
+            .where(or_(Permission.name == permission_name, Permission.name.contains(ANY_SEGMENT)))
+            .distinct()
+        ).scalars().all()
+        if permission_name in names:
+            return True
+        return bool(names) and PatternTrie(names).matches(permission_name)
+
+    @staticmethod
+    def roles_granting(permission_name: str):
+        """CTE of the roles holding the permission directly or by inheriting it from another role"""
+        roles = (
+            select(role_permissions.c.role_id.label("role_id"))
+            .join(Permission, Permission.id == role_permissions.c.permission_id)
+            .where(Permission.name == permission_name)
+            .cte("granting_roles", recursive=True)
+        )
+        return roles.union(
+            select(role_hierarchy.c.parent_id).join(roles, role_hierarchy.c.child_id == roles.c.role_id)
+        )
+
+    def page_effective_permissions(self, user_id: int, after: int, limit: int) -> list:
+        """(id, name) of the user's permissions with id > after, in id order, at most `limit`"""
+        return self.db.execute(
+            self._granted(user_id).where(Permission.id > after).distinct().order_by(Permission.id).limit(limit)
+        ).all()
+
+    def get_effective_permissions(self, user_id: int) -> dict:
+        """Every permission the user holds through any role, as {id: name}"""
+        rows = self.db.execute(self._granted(user_id).distinct()).all()
+        return {permission_id: name for permission_id, name in rows}
@@ -0,0 +1,50 @@
+import os
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from ..models import PolicyChange, PolicyVersion
+from .bulk import insert_ignoring_conflicts
+
+# Change log rows kept behind the current version; a worker that falls
+# further behind than this invalidates everything instead
+POLICY_CHANGE_LOG_SIZE = int(os.getenv("POLICY_CHANGE_LOG_SIZE", "10000"))
+_ROW_ID = 1
+
+class PolicyRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def current_version(self) -> int:
+        version = self.db.execute(select(PolicyVersion.version).where(PolicyVersion.id == _ROW_ID)).scalar()
+        return version or 0
+
+    def record_change(self, assignments=None) -> int:
+        """
+        Bump the policy version and log the (user_id, role_id) assignments it
+        made; None logs a change affecting every user. Call inside the
+        transaction making the change. Does not commit.
+        """
+        # Seeding the counter row cannot fail when two workers record the
+        # first change at once; the UPDATE then takes the row lock, so
+        # concurrent writers get distinct versions
+        self.db.execute(insert_ignoring_conflicts(self.db, PolicyVersion.__table__, [{"id": _ROW_ID, "version": 0}]))
+        self.db.execute(
+            update(PolicyVersion).where(PolicyVersion.id == _ROW_ID).values(version=PolicyVersion.version + 1)
+        )
+        version = self.current_version()
+
+        if assignments is None:
+            rows = [{"version": version, "user_id": None, "role_id": None}]
+        else:
+            rows = [{"version": version, "user_id": user_id, "role_id": role_id} for user_id, role_id in assignments]
+        if rows:
+            self.db.execute(insert(PolicyChange), rows)
+        self.db.execute(delete(PolicyChange).where(PolicyChange.version <= version - POLICY_CHANGE_LOG_SIZE))
+        return version
+
+    def changes_since(self, version: int) -> list:
+        """(version, user_id, role_id) rows logged after `version`, oldest first"""
+        return self.db.execute(
+            select(PolicyChange.version, PolicyChange.user_id, PolicyChange.role_id)
+            .where(PolicyChange.version > version)
+            .order_by(PolicyChange.version, PolicyChange.id)
+        ).all()
@@ -0,0 +1,46 @@
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from ..models import Role, role_hierarchy
+
+class RoleRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def inherits(self, role_id: int, other_id: int) -> bool:
+        """Whether `role_id` is `other_id` or inherits from it at any depth, as committed"""
+        if role_id == other_id:
+            return True
+        reachable = select(role_hierarchy.c.child_id.label("role_id")).where(
+            role_hierarchy.c.parent_id == role_id
+        ).cte("reachable_roles", recursive=True)
+        # UNION (not UNION ALL) stops at roles already seen, even on a cycle
+        reachable = reachable.union(
+            select(role_hierarchy.c.child_id).join(reachable, role_hierarchy.c.parent_id == reachable.c.role_id)
+        )
+        return self.db.execute(select(reachable.c.role_id).where(reachable.c.role_id == other_id).limit(1)).first() is not None
+
+    def add_child(self, parent_id: int, child_id: int) -> bool:
+        """Record that parent inherits child; False if it already did. Does not commit."""
+        linked = self.db.execute(
+            select(role_hierarchy.c.parent_id)
+            .where(role_hierarchy.c.parent_id == parent_id, role_hierarchy.c.child_id == child_id)
+        ).first()
+        if linked:
+            return False
+        self.db.execute(role_hierarchy.insert().values(parent_id=parent_id, child_id=child_id))
+        return True
+
+    def remove_child(self, parent_id: int, child_id: int) -> bool:
+        """Delete the edge; False if there was none. Does not commit."""
+        result = self.db.execute(
+            delete(role_hierarchy)
+            .where(role_hierarchy.c.parent_id == parent_id, role_hierarchy.c.child_id == child_id)
+        )
+        return result.rowcount > 0
+
+    def page_roles(self, after: int, limit: int, granting_roles=None) -> list:
+        """(id, name) of up to `limit` roles with id > after, in id order"""
+        query = select(Role.id, Role.name).where(Role.id > after)
+        if granting_roles is not None:
+            query = query.where(Role.id.in_(select(granting_roles.c.role_id)))
+        return self.db.execute(query.order_by(Role.id).limit(limit)).all()
@@ -0,0 +1,30 @@
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from ..models import RevokedToken
+from .bulk import insert_ignoring_conflicts
+
+class RevokedTokenRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add(self, jti: str, user_id: int, expires_at: int) -> bool:
+        """Record a revoked token id; False if it already was. Does not commit."""
+        row = {"jti": jti, "user_id": user_id, "expires_at": expires_at}
+        return self.db.execute(insert_ignoring_conflicts(self.db, RevokedToken.__table__, [row])).rowcount > 0
+
+    def is_revoked(self, jti: str, now: int) -> bool:
+        return self.db.execute(
+            select(RevokedToken.id).where(RevokedToken.jti == jti, RevokedToken.expires_at > now)
+        ).first() is not None
+
+    def revoked_since(self, last_id: int, now: int) -> list:
+        """(id, jti) of unexpired revocations recorded after row `last_id`"""
+        return self.db.execute(
+            select(RevokedToken.id, RevokedToken.jti)
+            .where(RevokedToken.id > last_id, RevokedToken.expires_at > now)
+            .order_by(RevokedToken.id)
+        ).all()
+
+    def purge_expired(self, now: int) -> int:
+        """Delete revocations of tokens that have expired anyway. Does not commit."""
+        return self.db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now)).rowcount
@@ -0,0 +1,92 @@
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+from ..models import User, user_roles
+from .bulk import chunked, insert_ignoring_conflicts
+
+class UserRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_user_by_id(self, user_id: int) -> User:
+        return self.db.get(User, user_id)
+
+    def get_username_and_role_ids(self, user_id: int):
+        """(username, [role ids]) in one round trip, or None if the user does not exist"""
+        rows = self.db.execute(
+            select(User.username, user_roles.c.role_id)
+            .outerjoin(user_roles, user_roles.c.user_id == User.id)
+            .where(User.id == user_id)
+        ).all()
+        if not rows:
+            return None
+        return rows[0].username, [role_id for _, role_id in rows if role_id is not None]
+
+    def get_usernames_and_role_ids(self, user_ids) -> dict:
+        """
+        Batch form of get_username_and_role_ids: {user_id: (username, [role ids])}
+        for the users that exist, one grouped query per chunk of ids.
+        """
+        found = {}
+        for chunk in chunked(sorted(set(user_ids))):
+            rows = self.db.execute(
+                select(User.id, User.username, user_roles.c.role_id)
+                .outerjoin(user_roles, user_roles.c.user_id == User.id)
+                .where(User.id.in_(chunk))
+            ).all()
+            for user_id, username, role_id in rows:
+                _, role_ids = found.setdefault(user_id, (username, []))
+                if role_id is not None:
+                    role_ids.append(role_id)
+        return found
+
+    def page_users(self, after: int, limit: int, role_id: int = None, granting_roles=None) -> list:
+        """
+        (id, username) of up to `limit` users with id > after, in id order.
+        Seeks on the primary key, so every page costs the same. Optionally
+        only users assigned `role_id`, or any role of the `granting_roles` CTE.
+        """
+        query = select(User.id, User.username).where(User.id > after)
+        if role_id is not None:
+            query = query.where(
+                exists().where(user_roles.c.user_id == User.id, user_roles.c.role_id == role_id)
+            )
+        if granting_roles is not None:
+            query = query.where(
+                exists().where(
+                    user_roles.c.user_id == User.id,
+                    user_roles.c.role_id.in_(select(granting_roles.c.role_id)),
+                )
+            )
+        return self.db.execute(query.order_by(User.id).limit(limit)).all()
+
+    def role_ids_by_user(self, user_ids) -> dict:
+        """{user_id: [role ids]} for one page of users"""
+        found = {user_id: [] for user_id in user_ids}
+        rows = self.db.execute(
+            select(user_roles.c.user_id, user_roles.c.role_id)
+            .where(user_roles.c.user_id.in_(list(found)))
+            .order_by(user_roles.c.user_id, user_roles.c.role_id)
+        )
+        for user_id, role_id in rows:
+            found[user_id].append(role_id)
+        return found
+
+    def existing_ids(self, model, ids) -> set:
+        found = set()
+        for chunk in chunked(sorted(set(ids))):
+            found.update(self.db.execute(select(model.id).where(model.id.in_(chunk))).scalars())
+        return found
+
+    def add_roles(self, pairs: list) -> set:
+        """
+        Insert (user_id, role_id) pairs with set-based INSERT ... ON CONFLICT DO
+        NOTHING and return the pairs that were actually new. Does not commit.
+        """
+        inserted = set()
+        for chunk in chunked(pairs):
+            rows = [{"user_id": user_id, "role_id": role_id} for user_id, role_id in chunk]
+            statement = insert_ignoring_conflicts(self.db, user_roles, rows).returning(
+                user_roles.c.user_id, user_roles.c.role_id
+            )
+            inserted.update(tuple(row) for row in self.db.execute(statement))
+        return inserted
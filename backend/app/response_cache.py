@@ -0,0 +1,77 @@
+"""
+Conditional GET and a server-side cache of rendered responses.
+
+A response's ETag combines the version of the resource with the caller's
+policy version (user id, permission mask and permission engine version),
+so it changes when either the data or what the caller may see changes.
+A matching If-None-Match is answered with 304 before the payload is built.
+Rendered bodies can also be kept in a size-bounded LRU under the same key.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+from .permission_engine import permission_engine
+
+# Rendered responses kept per process; 0 disables the cache
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "0"))
+
+
+def principal_etag(resource_version: str, user) -> str:
+    """Weak ETag for `resource_version` as seen by `user`"""
+    key = f"{resource_version}:{user.id}:{user.mask:x}:{permission_engine.version}"
+    return 'W/"' + hashlib.sha256(key.encode()).hexdigest()[:20] + '"'
+
+
+def check_not_modified(request: Request, etag: str):
+    """Raise 304 if If-None-Match already holds `etag` (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+
+
+class ResponseCache:
+    """LRU of rendered response bodies, evicting the least recently used beyond `maxsize`"""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body: bytes):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
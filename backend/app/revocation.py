@@ -0,0 +1,216 @@
+"""
+Token revocation by token id (jti) with a Bloom filter in front.
+
+Every unexpired revoked jti is in the filter, so a token that is not in it
+is certainly not revoked: that answer costs one hash and a few bit probes
+in memory. Only filter hits (revoked tokens, and false positives at
+roughly REVOCATION_BLOOM_ERROR_RATE) read the revoked_tokens table.
+Revocations expire with the token itself; the filter is rebuilt from the
+remaining rows every REVOCATION_REBUILD_SECONDS so it does not fill up.
+When the table cannot be read, is_revoked() raises RevocationCheckFailed
+and the token is refused: a revocation is never skipped because the
+database was unavailable.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from .database import SessionLocal
+from .repositories.policy_repository import PolicyRepository
+from .repositories.token_repository import RevokedTokenRepository
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
+
+
+class RevocationCheckFailed(Exception):
+    """Raised when revocations cannot be read; callers must refuse the token"""
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for `capacity` items at `error_rate`"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] >> (position & 7) & 1 for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    Revoked token ids of this worker: a Bloom filter of every unexpired
+    revocation, plus the jtis already confirmed against the table.
+    Revocations made by other workers arrive through sync(), which the
+    policy watcher calls whenever the policy version moves.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        capacity: int = REVOCATION_BLOOM_CAPACITY,
+        error_rate: float = REVOCATION_BLOOM_ERROR_RATE,
+        rebuild_seconds: float = REVOCATION_REBUILD_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self._filter = None
+        self._confirmed = {}
+        self._last_id = 0
+        self._rebuild_at = 0.0
+        self._lock = threading.Lock()
+        # Held while a missing filter is loaded, so concurrent checks load it once
+        self._load_lock = threading.Lock()
+        self._counts = {"filter_hits": 0, "false_positives": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._filter is not None
+
+    def might_be_revoked(self, claims) -> bool:
+        """In-memory probe; only True needs confirming with is_revoked()"""
+        if claims.token_id is None:
+            # Issued before tokens carried a jti; nothing can revoke them
+            return False
+        bloom = self._filter
+        if bloom is None:
+            return True
+        if claims.token_id not in bloom:
+            return False
+        self._counts["filter_hits"] += 1
+        return True
+
+    def is_revoked(self, claims) -> bool:
+        """
+        Authoritative answer, reading the table unless the jti is already
+        confirmed. Raises RevocationCheckFailed if the table cannot be read.
+        """
+        if claims.token_id is None:
+            return False
+        try:
+            if self._filter is None and claims.token_id not in self._load():
+                return False
+            if claims.token_id in self._confirmed:
+                return True
+            db = self.session_factory()
+            try:
+                revoked = RevokedTokenRepository(db).is_revoked(claims.token_id, int(time.time()))
+            finally:
+                db.close()
+        except Exception as error:
+            logger.exception("Token revocation check failed")
+            raise RevocationCheckFailed("Revoked tokens could not be read") from error
+        if revoked:
+            with self._lock:
+                self._confirmed[claims.token_id] = claims.expires_at
+        else:
+            self._counts["false_positives"] += 1
+        return revoked
+
+    def revoke(self, db, claims) -> bool:
+        """
+        Revoke a token and purge expired revocations in one transaction.
+        Takes effect in this worker at once and in the others on their next
+        policy version check. False if it was already revoked.
+        """
+        repo = RevokedTokenRepository(db)
+        repo.purge_expired(int(time.time()))
+        added = repo.add(claims.token_id, claims.user_id, claims.expires_at)
+        if added:
+            PolicyRepository(db).record_change([(claims.user_id, None)])
+        db.commit()
+        self._remember(claims)
+        return added
+
+    def _remember(self, claims):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(claims.token_id)
+            self._confirmed[claims.token_id] = claims.expires_at
+
+    def _load(self) -> BloomFilter:
+        with self._load_lock:
+            bloom = self._filter
+            return bloom if bloom is not None else self.reload()
+
+    def reload(self, db=None) -> BloomFilter:
+        """Rebuild the filter from every unexpired revocation"""
+        owned = db is None
+        db = db or self.session_factory()
+        try:
+            rows = RevokedTokenRepository(db).revoked_since(0, int(time.time()))
+        finally:
+            if owned:
+                db.close()
+        # Leave room to grow, so the filter stays near its error rate until the next rebuild
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for _, jti in rows:
+            bloom.add(jti)
+        now = time.time()
+        with self._lock:
+            self._confirmed = {jti: expires_at for jti, expires_at in self._confirmed.items() if expires_at > now}
+            # Revocations remembered while the rows were being read
+            for jti in self._confirmed:
+                bloom.add(jti)
+            self._filter = bloom
+            self._last_id = rows[-1][0] if rows else 0
+            self._rebuild_at = time.monotonic() + self.rebuild_seconds
+        return bloom
+
+    def sync(self, db):
+        """Add revocations recorded since the last sync, by this or any other worker"""
+        if self._filter is None:
+            return
+        bloom = self._filter
+        if time.monotonic() >= self._rebuild_at or bloom.count >= bloom.capacity:
+            self.reload(db)
+            return
+        rows = RevokedTokenRepository(db).revoked_since(self._last_id, int(time.time()))
+        with self._lock:
+            for row_id, jti in rows:
+                bloom.add(jti)
+                self._last_id = max(self._last_id, row_id)
+
+    def clear(self):
+        with self._lock:
+            self._filter = None
+            self._confirmed = {}
+            self._last_id = 0
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        return {
+            **self._counts,
+            "loaded": bloom is not None,
+            "entries": bloom.count if bloom else 0,
+            "filter_bits": bloom.size if bloom else 0,
+            "hashes": bloom.hashes if bloom else 0,
+            "confirmed": len(self._confirmed),
+        }
+
+
+revocation_list = RevocationList()
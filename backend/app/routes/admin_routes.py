@@ -1,25 +1,210 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from jose import JWTError
+from ..auth import verify_token
+from ..database import ASYNC_DB, async_pool_monitor, get_session, pool_monitor, run_db
 from ..middleware import require_permission
-from ..models import User, Role
-from ..schemas.user_schema import AssignRoleRequest, AssignRoleResponse
+from ..permission_cache import permission_cache
+from ..policy_snapshot import policy_store
+from ..repositories.user_repository import UserRepository
+from ..response_cache import response_cache
+from ..revocation import revocation_list
+from ..schemas.user_schema import (
+    AssignRoleRequest,
+    AssignRoleResponse,
+    BulkAssignRoleRequest,
+    BulkAssignRoleResponse,
+    CacheStatsResponse,
+    NamedPage,
+    RevokeTokenRequest,
+    RevokeTokenResponse,
+    RoleLinkRequest,
+    RoleLinkResponse,
+    UserPage,
+)
+from ..services.audit_service import ROLE_ASSIGNED, TOKEN_REVOKED, audit_log
+from ..services.policy_sync_service import policy_watcher
+from ..services.rbac_service import RBACService
 
 router = APIRouter()
 
+_ASSIGN_NOT_FOUND = {"user_not_found": "User not found", "role_not_found": "Role not found"}
+
 @router.post("/assign-role", response_model=AssignRoleResponse)
-def assign_role(
+async def assign_role(
     request: AssignRoleRequest,
-    db: Session = Depends(get_db),
+    db=Depends(get_session),
     admin=Depends(require_permission("ADMIN"))
 ):
-    user = db.query(User).get(request.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    role = db.query(Role).get(request.role_id)
-    if not role:
-        raise HTTPException(status_code=404, detail="Role not found")
-    if role not in user.roles:
-        user.roles.append(role)
-        db.commit()
+    result = (await run_db(
+        db, lambda session: RBACService(UserRepository(session)).assign_roles([(request.user_id, request.role_id)])
+    ))[0]
+    if result["status"] in _ASSIGN_NOT_FOUND:
+        raise HTTPException(status_code=404, detail=_ASSIGN_NOT_FOUND[result["status"]])
+    if result["status"] == "assigned":
+        audit_log.record(ROLE_ASSIGNED, admin.id, admin.username, request.user_id, f"role_id={request.role_id}")
     return {"status": "Role assigned"}
+
+def _bulk_pairs(request: BulkAssignRoleRequest) -> list:
+    if request.user_ids and request.role_id is None:
+        raise HTTPException(status_code=422, detail="role_id is required with user_ids")
+    pairs = [(item.user_id, item.role_id) for item in request.assignments]
+    pairs.extend((user_id, request.role_id) for user_id in request.user_ids)
+    return pairs
+
+def _bulk_response(results: list, admin) -> dict:
+    for result in results:
+        if result["status"] == "assigned":
+            audit_log.record(ROLE_ASSIGNED, admin.id, admin.username, result["user_id"], f"role_id={result['role_id']}")
+    return {
+        "assigned": sum(1 for result in results if result["status"] == "assigned"),
+        "results": results,
+    }
+
+@router.post("/assign-roles", response_model=BulkAssignRoleResponse)
+async def assign_roles(
+    request: BulkAssignRoleRequest,
+    db=Depends(get_session),
+    admin=Depends(require_permission("ADMIN"))
+):
+    """Assign many roles in one set-based transaction, with a result per pair"""
+    pairs = _bulk_pairs(request)
+    results = await run_db(db, lambda session: RBACService(UserRepository(session)).assign_roles(pairs))
+    return _bulk_response(results, admin)
+
+def _link_response(status: str) -> dict:
+    if status == "role_not_found":
+        raise HTTPException(status_code=404, detail="Role not found")
+    if status == "cycle":
+        raise HTTPException(status_code=409, detail="Role inheritance would create a cycle")
+    return {"status": status}
+
+@router.post("/role-hierarchy", response_model=RoleLinkResponse)
+async def link_roles(
+    request: RoleLinkRequest,
+    db=Depends(get_session),
+    admin=Depends(require_permission("ADMIN"))
+):
+    """Make parent_id inherit the permissions of child_id"""
+    status = await run_db(
+        db, lambda session: RBACService(UserRepository(session)).link_roles(request.parent_id, request.child_id)
+    )
+    return _link_response(status)
+
+@router.delete("/role-hierarchy/{parent_id}/{child_id}", response_model=RoleLinkResponse)
+async def unlink_roles(
+    parent_id: int,
+    child_id: int,
+    db=Depends(get_session),
+    admin=Depends(require_permission("ADMIN"))
+):
+    status = await run_db(db, lambda session: RBACService(UserRepository(session)).unlink_roles(parent_id, child_id))
+    return {"status": status}
+
+def _token_to_revoke(token: str):
+    try:
+        claims = verify_token(token)
+    except (JWTError, ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Invalid or expired token")
+    if claims.token_id is None:
+        raise HTTPException(status_code=422, detail="Token has no id and cannot be revoked")
+    return claims
+
+def _revoke_response(revoked: bool, claims, admin) -> dict:
+    if revoked:
+        audit_log.record(TOKEN_REVOKED, admin.id, admin.username, claims.user_id, f"jti={claims.token_id}")
+    return {"status": "revoked" if revoked else "already_revoked"}
+
+@router.post("/revoke-token", response_model=RevokeTokenResponse)
+async def revoke_token(
+    request: RevokeTokenRequest,
+    db=Depends(get_session),
+    admin=Depends(require_permission("ADMIN"))
+):
+    """Reject a token, e.g. a leaked one, until it would have expired"""
+    claims = _token_to_revoke(request.token)
+    revoked = await run_db(db, lambda session: revocation_list.revoke(session, claims))
+    return _revoke_response(revoked, claims, admin)
+
+@router.get("/revoked-tokens")
+def revoked_token_stats(admin=Depends(require_permission("ADMIN"))):
+    """Bloom filter size and how often requests needed the revoked_tokens table"""
+    return revocation_list.stats()
+
+PAGE_SIZE = Query(50, ge=1, le=500)
+AFTER = Query(0, ge=0, description="Id of the last item of the previous page")
+
+def _found(page):
+    if page is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return page
+
+@router.get("/users", response_model=UserPage)
+async def list_users(
+    after: int = AFTER,
+    limit: int = PAGE_SIZE,
+    role_id: int = None,
+    permission: str = None,
+    db=Depends(get_session),
+    admin=Depends(require_permission("ADMIN"))
+):
+    """Users in id order, optionally assigned role_id or holding permission"""
+    return await run_db(
+        db, lambda session: RBACService(UserRepository(session)).list_users(after, limit, role_id, permission)
+    )
+
+@router.get("/roles", response_model=NamedPage)
+async def list_roles(
+    after: int = AFTER,
+    limit: int = PAGE_SIZE,
+    permission: str = None,
+    db=Depends(get_session),
+    admin=Depends(require_permission("ADMIN"))
+):
+    """Roles in id order, optionally only those granting permission"""
+    return await run_db(db, lambda session: RBACService(UserRepository(session)).list_roles(after, limit, permission))
+
+@router.get("/users/{user_id}/permissions", response_model=NamedPage)
+async def list_user_permissions(
+    user_id: int,
+    after: int = AFTER,
+    limit: int = PAGE_SIZE,
+    db=Depends(get_session),
+    admin=Depends(require_permission("ADMIN"))
+):
+    """The user's effective permissions, including inherited ones, in id order"""
+    return _found(await run_db(
+        db, lambda session: RBACService(UserRepository(session)).list_user_permissions(user_id, after, limit)
+    ))
+
+@router.get("/permission-cache", response_model=CacheStatsResponse)
+def permission_cache_stats(admin=Depends(require_permission("ADMIN"))):
+    """Hit/miss counters of the effective-permission cache"""
+    return permission_cache.stats()
+
+@router.get("/policy-snapshot")
+def policy_snapshot_stats(admin=Depends(require_permission("ADMIN"))):
+    """Version, size and memory footprint of the in-memory policy snapshot"""
+    return policy_store.stats()
+
+@router.get("/policy-sync")
+def policy_sync_stats(admin=Depends(require_permission("ADMIN"))):
+    """Policy version this worker has caught up with and how it invalidated its caches"""
+    return policy_watcher.stats()
+
+@router.get("/response-cache")
+def response_cache_stats(admin=Depends(require_permission("ADMIN"))):
+    """Size and hit/miss counters of the rendered response cache"""
+    return response_cache.stats()
+
+@router.get("/audit-log")
+def audit_log_stats(admin=Depends(require_permission("ADMIN"))):
+    """Audit queue depth and how many events were written, dropped or failed"""
+    return audit_log.stats()
+
+@router.get("/db-pool")
+def db_pool_stats(admin=Depends(require_permission("ADMIN"))):
+    """Connection pool occupancy, overflow and checkout waits over time"""
+    stats = {"sync": pool_monitor.stats()}
+    if ASYNC_DB:
+        stats["async"] = async_pool_monitor.stats()
+    return stats
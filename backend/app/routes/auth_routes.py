@@ -1,20 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_session, run_db
 from ..models import User
-from ..schemas.user_schema import LoginRequest, TokenResponse
-from ..auth import create_token
+from ..schemas.user_schema import LoginRequest, RevokeTokenResponse
+from ..auth import STATELESS_AUTHZ, create_token, permission_claims
+from ..middleware import load_principal, request_claims_async, security
+from ..passwords import PasswordPoolFull, password_pool
+from ..permission_engine import permission_engine
+from ..rate_limit import limit_login_attempts
+from ..revocation import revocation_list
+from ..services.audit_service import LOGIN_FAILURE, LOGIN_SUCCESS, TOKEN_REVOKED, audit_log
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _login_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many concurrent logins, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+def _find_login(db: Session, username: str):
+    """(id, username, password) of the user, or None"""
+    return db.execute(select(User.id, User.username, User.password).where(User.username == username)).first()
+
+def _store_password(db: Session, user_id: int, password: str):
+    db.execute(update(User).where(User.id == user_id).values(password=password))
+    db.commit()
+
+def _login_claims(db: Session, user_id: int):
+    permission_engine.ensure_loaded(db)
+    # Read the version before the principal: a policy change landing while
+    # it loads must leave the claims stale rather than vouch for them
+    policy_version = permission_engine.policy_version
+    return permission_claims(load_principal(db, user_id), policy_version)
+
 @router.post("/login")
-def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(
+    request: LoginRequest,
+    throttle=Depends(limit_login_attempts),
+    db=Depends(get_session),
+):
+    # Async so that waiting on the hashing pool holds no threadpool thread:
+    # a login storm would otherwise starve every sync route and dependency.
+    # Only the short database steps go through run_db.
     try:
-        user = db.query(User).filter_by(username=request.username, password=request.password).first()
-        if not user:
+        user = await run_db(db, lambda session: _find_login(session, request.username))
+        try:
+            valid, upgraded = await password_pool.verify_async(request.password, user.password if user else None)
+        except PasswordPoolFull:
+            raise _login_busy()
+        if not valid:
+            audit_log.record(LOGIN_FAILURE, user.id if user else None, request.username)
             raise HTTPException(status_code=401, detail="Invalid credentials")
-        token = create_token(user.id)
+        if upgraded:
+            await run_db(db, lambda session: _store_password(session, user.id, upgraded))
+        claims = None
+        if STATELESS_AUTHZ:
+            claims = await run_db(db, lambda session: _login_claims(session, user.id))
+        token = create_token(user.id, claims)
+        audit_log.record(LOGIN_SUCCESS, user.id, user.username)
         return {"token": token, "username": user.username}
-    except Exception as e:
-        print(f"Login error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Login failed")
+        raise HTTPException(status_code=500, detail="Login failed")
+
+def _revocable(claims):
+    if claims.token_id is None:
+        raise HTTPException(status_code=422, detail="Token has no id and cannot be revoked")
+    return claims
+
+@router.post("/logout", response_model=RevokeTokenResponse)
+async def logout(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db=Depends(get_session),
+):
+    """Revoke the presented token for the rest of its lifetime"""
+    claims = _revocable(await request_claims_async(request, credentials.credentials))
+    await run_db(db, lambda session: revocation_list.revoke(session, claims))
+    audit_log.record(TOKEN_REVOKED, claims.user_id, claims.username, claims.user_id, "logout")
+    return {"status": "revoked"}
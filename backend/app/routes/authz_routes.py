@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..database import get_session, run_db
+from ..middleware import require_permission
+from ..repositories.user_repository import UserRepository
+from ..schemas.user_schema import AuthzCheckRequest, AuthzCheckResponse
+from ..services.rbac_service import RBACService
+
+router = APIRouter()
+
+# Services asking on behalf of their users need AUTHZ_CHECK; admins may always ask
+require_checker = require_permission({"ADMIN", "AUTHZ_CHECK"}, match="any")
+
+def _checks(request: AuthzCheckRequest) -> list:
+    if request.permissions and request.user_id is None:
+        raise HTTPException(status_code=422, detail="user_id is required with permissions")
+    checks = [(item.user_id, item.permission) for item in request.checks]
+    checks.extend((request.user_id, name) for name in request.permissions)
+    return checks
+
+@router.post("/check", response_model=AuthzCheckResponse)
+async def check(
+    request: AuthzCheckRequest,
+    db=Depends(get_session),
+    caller=Depends(require_checker)
+):
+    """Decide many (user, permission) checks with cached principals and one grouped query"""
+    checks = _checks(request)
+    decisions = await run_db(db, lambda session: RBACService(UserRepository(session)).check_permissions(checks))
+    return {"decisions": decisions}
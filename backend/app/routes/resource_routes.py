@@ -1,25 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse, Response
 from ..middleware import require_permission
+from ..response_cache import check_not_modified, principal_etag, response_cache
 
 router = APIRouter()
 
+# Bump whenever the data served below changes
+RESOURCE_VERSION = "2026-02-15"
+
 @router.get("/")
-def get_resource(
-    db: Session = Depends(get_db),
-    user=Depends(require_permission("READ_DATA"))
-):
+async def get_resource(request: Request, user=Depends(require_permission("READ_DATA"))):
     """
     Protected route that returns data.
     Only users with READ_DATA permission can access this.
+    Supports If-None-Match; unchanged data is answered with 304.
     """
-    return {
-        "message": "You have access to this resource",
-        "user_id": user.id,
-        "username": user.username,
-        "data": {
-            "content": "This is protected resource data",
-            "timestamp": "2026-02-15T00:00:00Z"
-        }
-    }
+    etag = principal_etag(RESOURCE_VERSION, user)
+    check_not_modified(request, etag)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    key = ("resource", etag)
+    body = response_cache.get(key)
+    if body is None:
+        body = JSONResponse({
+            "message": "You have access to this resource",
+            "user_id": user.id,
+            "username": user.username,
+            "data": {
+                "content": "This is protected resource data",
+                "timestamp": "2026-02-15T00:00:00Z"
+            }
+        }).body
+        response_cache.put(key, body)
+    return Response(body, media_type="application/json", headers=headers)
@@ -1,3 +1,4 @@
+from typing import List, Optional
 from pydantic import BaseModel
 
 class LoginRequest(BaseModel):
@@ -7,9 +8,84 @@ class LoginRequest(BaseModel):
 class TokenResponse(BaseModel):
     token: str
 
+class RevokeTokenRequest(BaseModel):
+    token: str
+
+class RevokeTokenResponse(BaseModel):
+    # revoked or already_revoked
+    status: str
+
 class AssignRoleRequest(BaseModel):
     user_id: int
     role_id: int
 
 class AssignRoleResponse(BaseModel):
     status: str
+
+class BulkAssignRoleRequest(BaseModel):
+    # Either explicit pairs, or one role for a list of users (or both)
+    assignments: List[AssignRoleRequest] = []
+    role_id: Optional[int] = None
+    user_ids: List[int] = []
+
+class AssignRoleResult(BaseModel):
+    user_id: int
+    role_id: int
+    status: str
+
+class BulkAssignRoleResponse(BaseModel):
+    assigned: int
+    results: List[AssignRoleResult]
+
+class RoleLinkRequest(BaseModel):
+    # parent_id inherits every permission of child_id
+    parent_id: int
+    child_id: int
+
+class RoleLinkResponse(BaseModel):
+    status: str
+
+class CacheStatsResponse(BaseModel):
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    hit_rate: float
+
+class AuthzCheck(BaseModel):
+    user_id: int
+    permission: str
+
+class AuthzCheckRequest(BaseModel):
+    # Either explicit (user, permission) tuples, or one user with many
+    # permissions (or both)
+    checks: List[AuthzCheck] = []
+    user_id: Optional[int] = None
+    permissions: List[str] = []
+
+class AuthzDecision(BaseModel):
+    user_id: int
+    permission: str
+    allowed: bool
+
+class AuthzCheckResponse(BaseModel):
+    decisions: List[AuthzDecision]
+
+class UserSummary(BaseModel):
+    id: int
+    username: str
+    role_ids: List[int]
+
+class UserPage(BaseModel):
+    items: List[UserSummary]
+    # Pass as `after` to fetch the next page; null on the last page
+    next_after: Optional[int]
+
+class NamedItem(BaseModel):
+    id: int
+    name: str
+
+class NamedPage(BaseModel):
+    items: List[NamedItem]
+    next_after: Optional[int]
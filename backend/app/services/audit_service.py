@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from ..database import SessionLocal
+from ..repositories.audit_repository import AuditRepository
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+# What record() does when the queue is full: "drop" the event at once, or
+# "block" the caller for up to AUDIT_BLOCK_TIMEOUT seconds before dropping it.
+# Blocking applies to callers in the threadpool only; on the event loop it
+# would stall every request of the worker, so async handlers always drop.
+AUDIT_OVERFLOW = os.getenv("AUDIT_OVERFLOW", "drop")
+AUDIT_BLOCK_TIMEOUT = float(os.getenv("AUDIT_BLOCK_TIMEOUT", "0.05"))
+
+LOGIN_SUCCESS = "login_success"
+LOGIN_FAILURE = "login_failure"
+PERMISSION_DENIED = "permission_denied"
+ROLE_ASSIGNED = "role_assigned"
+TOKEN_REVOKED = "token_revoked"
+
+_STOP = object()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class AuditLog:
+    """
+    Batched, asynchronous audit trail.
+    record() only appends to a bounded in-memory queue; a background thread
+    writes the events with one executemany per batch, as soon as
+    `batch_size` events are waiting or `flush_interval` seconds after the
+    first one arrived. A thread rather than an asyncio task, so sync routes
+    running in the threadpool can record without touching the event loop.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        queue_size: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL,
+        overflow: str = AUDIT_OVERFLOW,
+        block_timeout: float = AUDIT_BLOCK_TIMEOUT,
+    ):
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"overflow must be 'drop' or 'block', not {overflow!r}")
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counts = {"recorded": 0, "dropped": 0, "written": 0, "failed": 0, "batches": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def record(self, event: str, actor_id: int = None, actor_name: str = None, subject_id: int = None, detail: str = None):
+        entry = {
+            "created_at": datetime.now(timezone.utc),
+            "event": event,
+            "actor_id": actor_id,
+            "actor_name": actor_name,
+            "subject_id": subject_id,
+            "detail": detail,
+        }
+        try:
+            if self.overflow == "block" and not _on_event_loop():
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self._count("dropped")
+            return
+        self._count("recorded")
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write everything still queued, then stop the writer"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            # Blocks even under the drop policy: shutdown must not lose the stop marker
+            self._queue.put(_STOP)
+            thread.join()
+
+    def flush(self):
+        """Block until every event recorded so far has been written (or failed)"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is _STOP
+            events = batch[:-1] if stopping else batch
+            if events:
+                self._write(events)
+            for _ in batch:
+                self._queue.task_done()
+            if stopping:
+                return
+
+    def _write(self, events: list):
+        db = self.session_factory()
+        try:
+            AuditRepository(db).add_events(events)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._count("failed", len(events))
+            logger.exception("Failed to write %d audit events", len(events))
+            return
+        finally:
+            db.close()
+        with self._lock:
+            self._counts["written"] += len(events)
+            self._counts["batches"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                "queued": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval,
+                "overflow": self.overflow,
+                "running": self._thread is not None,
+            }
+
+
+audit_log = AuditLog()
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from ..database import SessionLocal
+from ..permission_cache import permission_cache
+from ..permission_engine import permission_engine
+from ..policy_snapshot import policy_store
+from ..revocation import revocation_list
+from ..repositories.policy_repository import POLICY_CHANGE_LOG_SIZE, PolicyRepository
+
+logger = logging.getLogger(__name__)
+
+# At most one policy_version query per worker in this many milliseconds;
+# 0 turns cross-worker invalidation off
+POLICY_SYNC_INTERVAL_MS = float(os.getenv("POLICY_SYNC_INTERVAL_MS", "500"))
+
+
+class PolicyWatcher:
+    """
+    Keeps this worker's in-process caches in step with policy changes made
+    by other workers. Each poll reads the policy_version row; when it moved,
+    the change log says which users to invalidate, and anything the log
+    cannot describe (a policy-wide change, or a gap after pruning) drops
+    everything. A change is therefore visible everywhere after at most one
+    interval plus the time to the next request. Full reloads run on a
+    background thread, so no request waits for them; the old tables keep
+    serving until the new ones are swapped in.
+    """
+
+    def __init__(self, session_factory=SessionLocal, interval_ms: float = POLICY_SYNC_INTERVAL_MS):
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self._seen = None
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+        self._counts = {"polls": 0, "selective": 0, "full": 0, "errors": 0}
+        self._reload_lock = threading.Lock()
+        self._reload_pending = False
+        self._reloader = None
+
+    def due(self) -> bool:
+        return self.interval > 0 and time.monotonic() >= self._next_poll
+
+    def poll(self):
+        """Check the version unless another thread is already checking or the interval has not passed"""
+        if not self.due() or not self._lock.acquire(blocking=False):
+            return
+        try:
+            if not self.due():
+                return
+            self._next_poll = time.monotonic() + self.interval
+            db = self.session_factory()
+            try:
+                self._sync(db)
+            finally:
+                db.close()
+        except Exception:
+            self._counts["errors"] += 1
+            logger.exception("Policy version check failed")
+        finally:
+            self._lock.release()
+
+    def _sync(self, db):
+        repo = PolicyRepository(db)
+        version = repo.current_version()
+        self._counts["polls"] += 1
+        seen, self._seen = self._seen, version
+        if seen is None or version == seen:
+            # The first poll only sets the baseline
+            return
+        revocation_list.sync(db)
+        changes = repo.changes_since(seen) if version - seen < POLICY_CHANGE_LOG_SIZE else None
+        if changes is None or version < seen or any(user_id is None for _, user_id, _ in changes):
+            self._counts["full"] += 1
+            self._start_reload()
+            return
+
+        self._counts["selective"] += 1
+        permission_cache.invalidate_many({user_id for _, user_id, _ in changes})
+        policy_store.add_roles((user_id, role_id) for _, user_id, role_id in changes if role_id is not None)
+        # Permission claims in tokens issued before the change are no longer trusted
+        permission_engine.bump_policy_version()
+
+    def _start_reload(self):
+        with self._reload_lock:
+            self._reload_pending = True
+            if self._reloader is None:
+                self._reloader = threading.Thread(target=self._reload, name="policy-reload", daemon=True)
+                self._reloader.start()
+
+    def _reload(self):
+        # Loops while polls keep asking for reloads, so the last change is never missed
+        while True:
+            with self._reload_lock:
+                if not self._reload_pending:
+                    self._reloader = None
+                    return
+                self._reload_pending = False
+            try:
+                db = self.session_factory()
+                try:
+                    permission_engine.load(db)
+                    if policy_store.snapshot is not None:
+                        policy_store.load(db)
+                finally:
+                    db.close()
+                # Only now, so the cache does not refill from the old tables
+                permission_cache.invalidate_all()
+            except Exception:
+                self._counts["errors"] += 1
+                logger.exception("Policy reload failed")
+                # Fall back to rebuilding lazily on the next check
+                permission_engine.invalidate()
+                policy_store.clear()
+                permission_cache.invalidate_all()
+
+    def wait_for_reload(self, timeout: float = None):
+        reloader = self._reloader
+        if reloader is not None:
+            reloader.join(timeout)
+
+    def reset(self):
+        with self._lock:
+            self._seen = None
+            self._next_poll = 0.0
+        self.wait_for_reload()
+
+    def stats(self) -> dict:
+        return {
+            **self._counts,
+            "version": self._seen,
+            "interval_ms": self.interval * 1000,
+            "reloading": self._reloader is not None,
+        }
+
+
+policy_watcher = PolicyWatcher()
@@ -0,0 +1,176 @@
+from sqlalchemy.exc import IntegrityError
+from ..models import Role, User
+from ..permission_cache import Principal, permission_cache
+from ..permission_engine import permission_engine
+from ..policy_snapshot import policy_store
+from ..repositories.permission_repository import PermissionRepository
+from ..repositories.policy_repository import PolicyRepository
+from ..repositories.role_repository import RoleRepository
+from ..repositories.user_repository import UserRepository
+
+def _page(rows: list, limit: int) -> tuple:
+    """Split a `limit + 1` row fetch into the page and the cursor of the next one (None at the end)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][0]
+    return rows, None
+
+class RBACService:
+    def __init__(self, user_repo: UserRepository, role_repo: RoleRepository = None):
+        self.user_repo = user_repo
+        self.role_repo = role_repo or RoleRepository(user_repo.db)
+
+    def assign_roles(self, pairs: list) -> list:
+        """
+        Assign many (user_id, role_id) pairs in one transaction.
+        Returns one {"user_id", "role_id", "status"} result per distinct pair,
+        where status is assigned, already_assigned, user_not_found or
+        role_not_found. Caches are invalidated once for the whole batch.
+        """
+        pairs = list(dict.fromkeys(pairs))
+        db = self.user_repo.db
+        for attempt in range(2):
+            users = self.user_repo.existing_ids(User, [user_id for user_id, _ in pairs])
+            roles = self.user_repo.existing_ids(Role, [role_id for _, role_id in pairs])
+            valid = [(user_id, role_id) for user_id, role_id in pairs if user_id in users and role_id in roles]
+            try:
+                inserted = self.user_repo.add_roles(valid) if valid else set()
+                if inserted:
+                    PolicyRepository(db).record_change(inserted)
+                db.commit()
+                break
+            except IntegrityError:
+                # A user or role was deleted after the existence check; check again
+                db.rollback()
+                if attempt:
+                    raise
+        if inserted:
+            permission_cache.invalidate_many({user_id for user_id, _ in inserted})
+            policy_store.add_roles(inserted)
+            permission_engine.bump_policy_version()
+
+        results = []
+        for user_id, role_id in pairs:
+            if user_id not in users:
+                status = "user_not_found"
+            elif role_id not in roles:
+                status = "role_not_found"
+            elif (user_id, role_id) in inserted:
+                status = "assigned"
+            else:
+                status = "already_assigned"
+            results.append({"user_id": user_id, "role_id": role_id, "status": status})
+        return results
+
+    def _principals(self, user_ids) -> dict:
+        """
+        Current principals for many users: the policy snapshot and cache hits
+        first, then one grouped query for every miss. Users that do not exist
+        are left out.
+        """
+        principals = {}
+        missing = []
+        for user_id in set(user_ids):
+            principal = policy_store.principal(user_id) or permission_cache.get(user_id)
+            if principal is not None and principal.version == permission_engine.version:
+                principals[user_id] = principal
+            else:
+                missing.append(user_id)
+        if not missing:
+            return principals
+
+        db = self.user_repo.db
+        generation = permission_cache.generation
+        for user_id, (username, role_ids) in self.user_repo.get_usernames_and_role_ids(missing).items():
+            mask = permission_engine.user_mask(db, role_ids)
+            principal = Principal(
+                id=user_id,
+                username=username,
+                mask=mask,
+                version=permission_engine.version,
+                role_ids=tuple(role_ids),
+                patterns=permission_engine.patterns_for_mask(mask),
+            )
+            permission_cache.put(principal, generation)
+            principals[user_id] = principal
+        return principals
+
+    def check_permissions(self, checks: list) -> list:
+        """
+        Decide many (user_id, permission_name) checks at once.
+        Returns one {"user_id", "permission", "allowed"} decision per check, in
+        order. Unknown users, and permissions neither granted by name nor
+        matched by a granted wildcard pattern, are denied.
+        """
+        principals = self._principals(user_id for user_id, _ in checks)
+        permission_engine.ensure_loaded(self.user_repo.db)
+        required = {name: permission_engine.compile([name]) for name in {name for _, name in checks}}
+
+        decisions = []
+        for user_id, name in checks:
+            principal = principals.get(user_id)
+            allowed = principal is not None and (
+                permission_engine.has_all(principal.mask, required[name])
+                or (principal.patterns is not None and principal.patterns.matches(name))
+            )
+            decisions.append({"user_id": user_id, "permission": name, "allowed": allowed})
+        return decisions
+
+    def link_roles(self, parent_id: int, child_id: int) -> str:
+        """
+        Make parent inherit child's permissions. Returns linked,
+        already_linked, role_not_found or cycle (child already inherits parent).
+        """
+        db = self.user_repo.db
+        if self.user_repo.existing_ids(Role, [parent_id, child_id]) != {parent_id, child_id}:
+            return "role_not_found"
+        # Bumping the policy version first locks its row until commit, so
+        # concurrent hierarchy changes on any worker are serialised and the
+        # cycle check below sees every edge committed before it
+        PolicyRepository(db).record_change()
+        if self.role_repo.inherits(child_id, parent_id):
+            db.rollback()
+            return "cycle"
+        if not self.role_repo.add_child(parent_id, child_id):
+            db.rollback()
+            return "already_linked"
+        db.commit()
+        try:
+            permission_engine.add_inheritance(parent_id, child_id)
+        except ValueError:
+            # This worker's tables are behind the database; rebuild them
+            permission_engine.load(db)
+        return "linked"
+
+    def unlink_roles(self, parent_id: int, child_id: int) -> str:
+        """Stop parent inheriting child. Returns unlinked or not_linked."""
+        if not self.role_repo.remove_child(parent_id, child_id):
+            return "not_linked"
+        PolicyRepository(self.user_repo.db).record_change()
+        self.user_repo.db.commit()
+        permission_engine.remove_inheritance(parent_id, child_id)
+        return "unlinked"
+
+    def list_users(self, after: int, limit: int, role_id: int = None, permission: str = None) -> dict:
+        """One keyset page of users, optionally those assigned role_id or holding permission"""
+        granting = PermissionRepository.roles_granting(permission) if permission else None
+        rows, next_after = _page(self.user_repo.page_users(after, limit + 1, role_id, granting), limit)
+        role_ids = self.user_repo.role_ids_by_user([user_id for user_id, _ in rows]) if rows else {}
+        return {
+            "items": [{"id": user_id, "username": username, "role_ids": role_ids[user_id]} for user_id, username in rows],
+            "next_after": next_after,
+        }
+
+    def list_roles(self, after: int, limit: int, permission: str = None) -> dict:
+        """One keyset page of roles, optionally those granting permission (directly or inherited)"""
+        granting = PermissionRepository.roles_granting(permission) if permission else None
+        rows, next_after = _page(self.role_repo.page_roles(after, limit + 1, granting), limit)
+        return {"items": [{"id": role_id, "name": name} for role_id, name in rows], "next_after": next_after}
+
+    def list_user_permissions(self, user_id: int, after: int, limit: int):
+        """One keyset page of the user's effective permissions, or None if the user does not exist"""
+        if not self.user_repo.existing_ids(User, [user_id]):
+            return None
+        repo = PermissionRepository(self.user_repo.db)
+        rows, next_after = _page(repo.page_effective_permissions(user_id, after, limit + 1), limit)
+        return {"items": [{"id": permission_id, "name": name} for permission_id, name in rows], "next_after": next_after}
@@ -0,0 +1,95 @@
+"""
+Throughput of the access review export.
+
+Builds a role matrix of --roles roles over --permissions permissions, each
+role granting --grants of them, then streams --users synthetic users holding
+1 to --max-roles roles each through the matrix product and the Parquet
+writer (no database involved). For comparison, the per-user path, OR-ing
+role masks in the permission engine and naming the bits, is timed on a
+sample and extrapolated. Run from the backend directory:
+
+    python -m benchmarks.bench_access_report --users 1000000 --roles 500 --permissions 2000
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+from app.access_report import DEFAULT_BATCH_SIZE, RoleMatrix, write_report
+from app.permission_engine import _EngineState, _transitive_closure, permission_engine
+
+
+def build_grants(roles: int, permissions: int, grants: int, rng):
+    return [(role_id, int(bit)) for role_id in range(1, roles + 1)
+            for bit in rng.choice(permissions, size=min(grants, permissions), replace=False)]
+
+
+def synthetic_batches(users: int, roles: int, max_roles: int, batch_size: int, rng):
+    for first in range(1, users + 1, batch_size):
+        user_ids = np.arange(first, min(first + batch_size, users + 1), dtype=np.int64)
+        counts = rng.integers(1, max_roles + 1, size=len(user_ids))
+        rows = np.repeat(np.arange(len(user_ids)), counts)
+        # Duplicate assignments only add to the product's counts, never to the result
+        role_ids = rng.integers(1, roles + 1, size=len(rows))
+        yield user_ids, [f"user{user_id}" for user_id in user_ids.tolist()], rows, role_ids
+
+
+def per_user_seconds(grants, roles: int, permissions: int, max_roles: int, sample: int, rng) -> float:
+    """Seconds per user for OR-ing engine role masks and naming the granted bits"""
+    direct_masks = dict.fromkeys(range(1, roles + 1), 0)
+    for role_id, bit in grants:
+        direct_masks[role_id] |= 1 << bit
+    names = tuple(f"PERMISSION_{bit}" for bit in range(permissions))
+    permission_engine._state = _EngineState(
+        version=1,
+        bits={name: bit for bit, name in enumerate(names)},
+        names=names,
+        direct_masks=direct_masks,
+        children={},
+        closure=_transitive_closure(direct_masks, {}),
+    )
+    assignments = [rng.integers(1, roles + 1, size=rng.integers(1, max_roles + 1)).tolist() for _ in range(sample)]
+    start = time.perf_counter()
+    for role_ids in assignments:
+        permission_engine.names_for_mask(permission_engine.mask_for_roles(role_ids))
+    return (time.perf_counter() - start) / sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--roles", type=int, default=500)
+    parser.add_argument("--permissions", type=int, default=2000)
+    parser.add_argument("--grants", type=int, default=20, help="permissions granted per role")
+    parser.add_argument("--max-roles", type=int, default=4, help="roles per user, at most")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--sample", type=int, default=2000, help="users timed on the per-user path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    grants = build_grants(args.roles, args.permissions, args.grants, rng)
+    start = time.perf_counter()
+    role_matrix = RoleMatrix(range(1, args.roles + 1), [f"PERMISSION_{bit}" for bit in range(args.permissions)], grants)
+    matrix_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "access_review.parquet")
+        start = time.perf_counter()
+        count = write_report(role_matrix, synthetic_batches(args.users, args.roles, args.max_roles, args.batch_size, rng), path)
+        export_seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    per_user = per_user_seconds(grants, args.roles, args.permissions, args.max_roles, args.sample, rng)
+
+    print(f"users={count} roles={args.roles} permissions={args.permissions} batch={args.batch_size}")
+    print(f"role matrix built in {matrix_seconds * 1e3:.1f} ms ({role_matrix.matrix.nnz} grants)")
+    print(f"exported in {export_seconds:.2f}s ({count / export_seconds:,.0f} users/s), file {size / 2**20:.1f} MiB, peak RSS {peak:.0f} MiB")
+    print(f"per-user masks {per_user * 1e6:.1f} us/user, {per_user * count:.1f}s extrapolated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark the ASGI AuthorizationMiddleware against the BaseHTTPMiddleware
+implementation it replaced.
+
+Requests are driven straight through the ASGI interface (no sockets), so the
+numbers isolate middleware overhead. Run from the backend directory:
+
+    python -m benchmarks.bench_middleware --requests 20000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+from jose import JWTError
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.auth import create_token, verify_token
+from app.middleware import AuthorizationMiddleware
+
+
+class LegacyAuthorizationMiddleware(BaseHTTPMiddleware):
+    """The previous BaseHTTPMiddleware implementation, kept for comparison"""
+
+    PROTECTED_PREFIXES = ["/resource", "/admin"]
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+
+        if any(path.startswith(prefix) for prefix in self.PROTECTED_PREFIXES):
+            auth_header = request.headers.get("Authorization")
+
+            if not auth_header:
+                return JSONResponse(
+                    status_code=401,
+                    content={"detail": "Missing authorization header"}
+                )
+
+            try:
+                scheme, token = auth_header.split()
+                if scheme.lower() != "bearer":
+                    raise ValueError("Invalid auth scheme")
+            except ValueError:
+                return JSONResponse(
+                    status_code=401,
+                    content={"detail": "Invalid authorization header format"}
+                )
+
+            try:
+                claims = verify_token(token)
+                request.state.claims = claims
+                request.state.user_id = claims.user_id
+            except (JWTError, ValueError, TypeError):
+                return JSONResponse(
+                    status_code=401,
+                    content={"detail": "Invalid or expired token"}
+                )
+
+        response = await call_next(request)
+        return response
+
+
+def build_app(middleware_class):
+    app = FastAPI()
+    app.add_middleware(middleware_class)
+
+    @app.get("/")
+    async def root():
+        return {"message": "ok"}
+
+    @app.get("/resource")
+    async def resource():
+        return {"message": "ok"}
+
+    return app
+
+
+async def call(app, path: str, headers: list) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    sent_request = False
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - start
+
+
+async def run(app, path: str, headers: list, total: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            latencies.append(await call(app, path, headers))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+async def main(total: int, concurrency: int):
+    token = create_token(1)
+    scenarios = [
+        ("unprotected /", "/", []),
+        ("protected /resource", "/resource", [(b"authorization", f"Bearer {token}".encode())]),
+    ]
+    implementations = [
+        ("BaseHTTPMiddleware", build_app(LegacyAuthorizationMiddleware)),
+        ("ASGI", build_app(AuthorizationMiddleware)),
+    ]
+
+    print(f"{'scenario':<22}{'middleware':<20}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for scenario, path, headers in scenarios:
+        for name, app in implementations:
+            # Warm up caches (routing, token verifier) before measuring
+            await run(app, path, headers, min(total, 500), concurrency)
+            result = await run(app, path, headers, total, concurrency)
+            print(f"{scenario:<22}{name:<20}{result['rps']:>10.0f}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,86 @@
+"""
+Memory and lookup cost of the in-memory policy snapshot.
+
+Builds a snapshot of --users users holding --edges user-role assignments in
+total (no database involved), then reports its footprint as measured by
+tracemalloc, random principal lookups per second and the latency of
+publishing a single-assignment update. Run from the backend directory:
+
+    python -m benchmarks.bench_snapshot --users 250000 --edges 1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.permission_engine import _EngineState, _transitive_closure, permission_engine
+from app.policy_snapshot import POLICY_SNAPSHOT_SHARDS, PolicySnapshot, PolicyStore, _ShardBuilder
+
+
+def build_store(users: int, edges: int, roles: int, shards: int) -> PolicyStore:
+    store = PolicyStore(shards=shards)
+    builders = [_ShardBuilder() for _ in range(shards)]
+    per_user, extra = divmod(edges, users)
+    rng = random.Random(0)
+    for user_id in range(1, users + 1):
+        builder = builders[user_id % shards]
+        builder.add_user(user_id, f"user{user_id}")
+        count = per_user + (1 if user_id <= extra else 0)
+        for role_id in sorted(rng.sample(range(1, roles + 1), min(count, roles))):
+            builder.add_role(role_id)
+    store._snapshot = PolicySnapshot(1, tuple(builder.build() for builder in builders))
+    return store
+
+
+def load_engine(roles: int):
+    """Role masks for the synthetic roles, as if loaded from the database"""
+    direct_masks = {role_id: 1 << (role_id % 32) for role_id in range(1, roles + 1)}
+    permission_engine._state = _EngineState(
+        version=1,
+        bits={f"PERMISSION_{bit}": bit for bit in range(32)},
+        names=tuple(f"PERMISSION_{bit}" for bit in range(32)),
+        direct_masks=direct_masks,
+        children={},
+        closure=_transitive_closure(direct_masks, {}),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=250000)
+    parser.add_argument("--edges", type=int, default=1000000)
+    parser.add_argument("--roles", type=int, default=200)
+    parser.add_argument("--shards", type=int, default=POLICY_SNAPSHOT_SHARDS)
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    load_engine(args.roles)
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = build_store(args.users, args.edges, args.roles, args.shards)
+    build_seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = store.stats()
+
+    rng = random.Random(1)
+    user_ids = [rng.randint(1, args.users) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for user_id in user_ids:
+        store.principal(user_id)
+    lookup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user_id in user_ids[:100]:
+        store.add_roles([(user_id, 1)])
+    swap_seconds = (time.perf_counter() - start) / 100
+
+    print(f"users={stats['users']} edges={stats['edges']} shards={stats['shards']}")
+    print(f"built in {build_seconds:.2f}s")
+    print(f"arrays {stats['memory_bytes'] / 2**20:.1f} MiB, retained {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB")
+    print(f"lookups {args.lookups / lookup_seconds:,.0f}/s ({lookup_seconds / args.lookups * 1e6:.2f} us each)")
+    print(f"single assignment swap {swap_seconds * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,15 @@ from app.database import Base
 from app.main import app
 from app.database import get_db
 from app.models import User, Role, Permission
-from app.auth import create_token
+from app.auth import create_token, token_verifier
+from app.permission_cache import permission_cache
+from app.permission_engine import permission_engine
+from app.policy_snapshot import policy_store
+from app.rate_limit import login_rate_limiter
+from app.response_cache import response_cache
+from app.revocation import revocation_list
+from app.services.audit_service import audit_log
+from app.services.policy_sync_service import policy_watcher
 
 # Create test database
 engine = create_engine(
@@ -28,6 +36,9 @@ engine = create_engine(
     poolclass=StaticPool,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+audit_log.session_factory = TestingSessionLocal
+policy_watcher.session_factory = TestingSessionLocal
+revocation_list.session_factory = TestingSessionLocal
 
 @pytest.fixture(scope="function")
 def db():
@@ -39,6 +50,18 @@ def db():
         session.close()
         Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(autouse=True)
+def reset_authorization_state():
+    # In-process caches outlive the per-test database
+    permission_cache.clear()
+    permission_engine.invalidate()
+    policy_store.clear()
+    policy_watcher.reset()
+    revocation_list.clear()
+    login_rate_limiter.clear()
+    response_cache.clear()
+    token_verifier.clear()
+
 @pytest.fixture(scope="function")
 def client(db):
     def override_get_db():
@@ -66,3 +89,15 @@ def user_token(client, db):
     # Login to get token
     response = client.post("/auth/login", json={"username": "testuser", "password": "testpass"})
     return f"Bearer {response.json()['token']}"
+
+@pytest.fixture(scope="function")
+def admin_token(client, db):
+    # Create an admin user holding every permission
+    permissions = [Permission(name=name) for name in ("READ_DATA", "WRITE_DATA", "ADMIN")]
+    role = Role(name="Admin", permissions=permissions)
+    user = User(username="admin", password="admin123", roles=[role])
+    db.add(user)
+    db.commit()
+
+    response = client.post("/auth/login", json={"username": "admin", "password": "admin123"})
+    return f"Bearer {response.json()['token']}"
@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.access_report import export
+from app.database import Base
+from app.models import User, Role, Permission
+
+
+def test_export_matches_role_grants(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'report.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        read, write = Permission(name="READ_DATA"), Permission(name="WRITE_DATA")
+        report_read, report_any = Permission(name="reports:2024:read"), Permission(name="reports:**")
+        viewer = Role(name="Viewer", permissions=[read])
+        editor = Role(name="Editor", permissions=[write], children=[viewer])
+        auditor = Role(name="Auditor", permissions=[report_any])
+        db.add_all([report_read, Role(name="Empty")])
+        db.add_all([User(username=f"viewer{i}", password="pw", roles=[viewer]) for i in range(5)])
+        db.add(User(username="editor", password="pw", roles=[editor]))
+        db.add(User(username="auditor", password="pw", roles=[auditor, viewer]))
+        db.add(User(username="loner", password="pw"))
+        db.commit()
+
+    path = tmp_path / "access.parquet"
+    assert export(engine, path, batch_size=3) == 8
+    table = pq.read_table(path)
+    assert pq.ParquetFile(path).num_row_groups == 3
+    rows = {row["username"]: sorted(row["permissions"]) for row in table.to_pylist()}
+    assert rows["viewer0"] == ["READ_DATA"]
+    assert rows["editor"] == ["READ_DATA", "WRITE_DATA"]
+    assert rows["auditor"] == ["READ_DATA", "reports:**", "reports:2024:read"]
+    assert rows["loner"] == []
+    assert table.column("user_id").to_pylist() == sorted(table.column("user_id").to_pylist())
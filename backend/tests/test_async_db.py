@@ -0,0 +1,40 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app import middleware
+from app.revocation import revocation_list
+from app.auth import create_token
+from app.database import Base, get_async_db
+from app.models import User, Role, Permission
+
+def test_async_checker_resolves_permissions(tmp_path, monkeypatch):
+    path = tmp_path / "authz.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    with Session(sync_engine) as db:
+        db.add(User(username="reader", password="pw", roles=[Role(name="Reader", permissions=[Permission(name="READ_DATA")])]))
+        db.add(User(username="nobody", password="pw"))
+        db.commit()
+
+    sessions = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))
+    async def override_get_async_db():
+        async with sessions() as db:
+            yield db
+
+    monkeypatch.setattr(middleware, "ASYNC_DB", True)
+    monkeypatch.setattr(revocation_list, "session_factory", lambda: Session(sync_engine))
+    probe = FastAPI()
+    probe.dependency_overrides[get_async_db] = override_get_async_db
+
+    @probe.get("/read")
+    async def read(user=Depends(middleware.require_permission("READ_DATA"))):
+        return {"username": user.username}
+
+    with TestClient(probe) as probe_client:
+        response = probe_client.get("/read", headers={"Authorization": f"Bearer {create_token(1)}"})
+        assert response.json() == {"username": "reader"}
+        response = probe_client.get("/read", headers={"Authorization": f"Bearer {create_token(2)}"})
+        assert response.status_code == 403
@@ -1,6 +1,621 @@
+from app.models import User, Role, Permission
+
 def test_permission_denied(client, user_token):
     response = client.get(
         "/resource",
         headers={"Authorization": user_token}
     )
     assert response.status_code == 403
+
+def test_role_assignment_invalidates_cached_permissions(client, db, admin_token, user_token):
+    reader = Role(name="Reader", permissions=[db.query(Permission).filter_by(name="READ_DATA").one()])
+    db.add(reader)
+    db.commit()
+    user = db.query(User).filter_by(username="testuser").one()
+
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 403
+    response = client.post(
+        "/admin/assign-role",
+        json={"user_id": user.id, "role_id": reader.id},
+        headers={"Authorization": admin_token}
+    )
+    assert response.status_code == 200
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 200
+
+def test_permission_cache_stats(client, admin_token):
+    client.get("/resource", headers={"Authorization": admin_token})
+    client.get("/resource", headers={"Authorization": admin_token})
+    stats = client.get("/admin/permission-cache", headers={"Authorization": admin_token}).json()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+
+def test_require_permission_any_and_all(db, user_token):
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+    from app.database import get_db
+    from app.middleware import require_permission
+
+    db.add(Permission(name="ADMIN"))
+    reader = Role(name="Reader", permissions=[Permission(name="READ_DATA")])
+    user = db.query(User).filter_by(username="testuser").one()
+    user.roles.append(reader)
+    db.commit()
+
+    def override_get_db():
+        yield db
+
+    probe = FastAPI()
+    probe.dependency_overrides[get_db] = override_get_db
+
+    @probe.get("/any")
+    def any_of(user=Depends(require_permission({"READ_DATA", "ADMIN"}, match="any"))):
+        return {}
+
+    @probe.get("/all")
+    def all_of(user=Depends(require_permission({"READ_DATA", "ADMIN"}))):
+        return {}
+
+    with TestClient(probe) as probe_client:
+        headers = {"Authorization": user_token}
+        assert probe_client.get("/any", headers=headers).status_code == 200
+        response = probe_client.get("/all", headers=headers)
+        assert response.status_code == 403
+        assert response.json()["detail"] == "Permissions 'ADMIN', 'READ_DATA' required"
+
+def test_stateless_token_skips_database_until_policy_changes(client, db, admin_token, monkeypatch):
+    from app.database import get_db
+    from app.main import app
+    from app.permission_engine import permission_engine
+    from app.routes import auth_routes
+
+    monkeypatch.setattr(auth_routes, "STATELESS_AUTHZ", True)
+    token = client.post("/auth/login", json={"username": "admin", "password": "admin123"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    opened = []
+    def counting_get_db():
+        opened.append(True)
+        yield db
+
+    app.dependency_overrides[get_db] = counting_get_db
+    assert client.get("/resource", headers=headers).json()["username"] == "admin"
+    assert opened == []
+
+    # After a policy change the token's claims are stale and the database decides
+    permission_engine.bump_policy_version()
+    assert client.get("/resource", headers=headers).status_code == 200
+    assert opened == [True]
+
+def test_stateless_claims_stale_if_policy_changes_during_login(client, db, admin_token, monkeypatch):
+    from app.database import get_db
+    from app.main import app
+    from app.permission_engine import permission_engine
+    from app.routes import auth_routes
+
+    real_load_principal = auth_routes.load_principal
+    def load_then_change_policy(session, user_id):
+        principal = real_load_principal(session, user_id)
+        permission_engine.bump_policy_version()
+        return principal
+
+    monkeypatch.setattr(auth_routes, "STATELESS_AUTHZ", True)
+    monkeypatch.setattr(auth_routes, "load_principal", load_then_change_policy)
+    token = client.post("/auth/login", json={"username": "admin", "password": "admin123"}).json()["token"]
+
+    opened = []
+    def counting_get_db():
+        opened.append(True)
+        yield db
+
+    app.dependency_overrides[get_db] = counting_get_db
+    assert client.get("/resource", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert opened == [True]
+
+def test_token_verified_once_and_cached(client, admin_token, monkeypatch):
+    from app import auth
+
+    decoded = []
+    real_decode = auth.jwt.decode
+    def counting_decode(*args, **kwargs):
+        decoded.append(True)
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    for _ in range(3):
+        assert client.get("/resource", headers={"Authorization": admin_token}).status_code == 200
+    assert len(decoded) == 1
+
+def test_middleware_rejects_protected_paths_only(client):
+    assert client.get("/").status_code == 200
+    response = client.get("/resource")
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Missing authorization header"}
+    response = client.get("/admin/permission-cache", headers={"Authorization": "Token abc"})
+    assert response.json() == {"detail": "Invalid authorization header format"}
+    response = client.get("/resource", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.json() == {"detail": "Invalid or expired token"}
+
+def test_db_pool_stats_admin_only(client, admin_token, user_token):
+    assert client.get("/admin/db-pool", headers={"Authorization": user_token}).status_code == 403
+    stats = client.get("/admin/db-pool", headers={"Authorization": admin_token}).json()
+    assert set(stats["sync"]) == {"name", "current", "totals", "history"}
+
+def test_permission_repository_pushdown(db, admin_token):
+    from app.repositories.permission_repository import PermissionRepository
+
+    admin = db.query(User).filter_by(username="admin").one()
+    repository = PermissionRepository(db)
+    assert repository.has_permission(admin.id, "ADMIN")
+    assert not repository.has_permission(admin.id, "DELETE_DATA")
+    assert set(repository.get_effective_permissions(admin.id).values()) == {"READ_DATA", "WRITE_DATA", "ADMIN"}
+
+def test_bulk_role_assignment(client, db, admin_token, user_token):
+    reader = Role(name="Reader", permissions=[db.query(Permission).filter_by(name="READ_DATA").one()])
+    db.add(reader)
+    db.commit()
+    admin = db.query(User).filter_by(username="admin").one()
+    user = db.query(User).filter_by(username="testuser").one()
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 403
+
+    response = client.post(
+        "/admin/assign-roles",
+        json={
+            "role_id": reader.id,
+            "user_ids": [user.id, admin.id, 999],
+            "assignments": [{"user_id": admin.id, "role_id": 999}, {"user_id": user.id, "role_id": reader.id}],
+        },
+        headers={"Authorization": admin_token}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["assigned"] == 2
+    assert [result["status"] for result in body["results"]] == [
+        "role_not_found", "assigned", "assigned", "user_not_found"
+    ]
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 200
+
+def test_bulk_assignment_reports_roles_deleted_mid_request(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base
+    from app.repositories.user_repository import UserRepository
+    from app.services.rbac_service import RBACService
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as setup:
+        setup.add_all([User(username="racer", password="pw"), Role(name="Doomed"), Role(name="Kept")])
+        setup.commit()
+        user_id = setup.query(User.id).scalar()
+        doomed, kept = (setup.query(Role.id).filter_by(name=name).scalar() for name in ("Doomed", "Kept"))
+
+    existing_ids = UserRepository.existing_ids
+    def delete_after_check(self, model, ids):
+        found = existing_ids(self, model, ids)
+        if model is Role and doomed in found:
+            # Another admin deletes the role between the check and the insert
+            with Session() as other:
+                other.query(Role).filter_by(id=doomed).delete()
+                other.commit()
+        return found
+    monkeypatch.setattr(UserRepository, "existing_ids", delete_after_check)
+
+    with Session() as db:
+        results = RBACService(UserRepository(db)).assign_roles([(user_id, doomed), (user_id, kept)])
+    assert [result["status"] for result in results] == ["role_not_found", "assigned"]
+
+def test_batch_authorization_check(client, db, admin_token, user_token):
+    from app.permission_cache import permission_cache
+
+    admin = db.query(User).filter_by(username="admin").one()
+    user = db.query(User).filter_by(username="testuser").one()
+    assert client.post("/authz/check", json={}, headers={"Authorization": user_token}).status_code == 403
+
+    response = client.post(
+        "/authz/check",
+        json={
+            "checks": [
+                {"user_id": user.id, "permission": "READ_DATA"},
+                {"user_id": 999, "permission": "READ_DATA"},
+            ],
+            "user_id": admin.id,
+            "permissions": ["ADMIN", "WRITE_DATA", "DELETE_DATA"],
+        },
+        headers={"Authorization": admin_token}
+    )
+    assert response.status_code == 200
+    assert [decision["allowed"] for decision in response.json()["decisions"]] == [False, False, True, True, False]
+    assert permission_cache.get(user.id) is not None
+
+def test_metrics_endpoint(client, admin_token):
+    assert client.get("/resource/").status_code == 401
+    assert client.get("/resource/", headers={"Authorization": admin_token}).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'securegate_auth_failures_total{reason="missing_header"}' in body
+    assert 'securegate_http_requests_total{method="GET",route="/resource/",status="200"}' in body
+    assert 'securegate_stage_duration_seconds_bucket{stage="jwt_decode",le="+Inf"}' in body
+    assert 'securegate_authz_decisions_total{source="db",result="allowed"}' in body
+
+def test_metric_shards_merge_across_threads():
+    import threading
+    from app.metrics import Histogram, REGISTRY
+
+    histogram = Histogram("test_seconds", "Test histogram", ("stage",), buckets=(0.1, 1.0))
+    REGISTRY.remove(histogram)
+    workers = [threading.Thread(target=histogram.observe, args=(("a",), value)) for value in (0.05, 0.5, 5.0)]
+    for worker in workers:
+        worker.start()
+        worker.join()
+    assert histogram.collect() == {("a",): [1, 1, 1, 5.55, 3]}
+    assert 'securegate_test_seconds_bucket{stage="a",le="1.0"} 2' in list(histogram.render())
+
+def test_audit_events_are_written_in_batches(client, db, admin_token, user_token):
+    from app.models import AuditEvent
+    from app.services.audit_service import audit_log
+
+    client.post("/auth/login", json={"username": "testuser", "password": "wrong"})
+    assert client.get("/admin/permission-cache", headers={"Authorization": user_token}).status_code == 403
+    user = db.query(User).filter_by(username="testuser").one()
+    role = db.query(Role).filter_by(name="Admin").one()
+    client.post("/admin/assign-role", json={"user_id": user.id, "role_id": role.id}, headers={"Authorization": admin_token})
+
+    audit_log.flush()
+    events = [(event.event, event.actor_name) for event in db.query(AuditEvent).order_by(AuditEvent.id)]
+    # The fixtures log in before the test starts
+    assert [event for event in events if event[0] != "login_success"] == [
+        ("login_failure", "testuser"),
+        ("permission_denied", "testuser"),
+        ("role_assigned", "admin"),
+    ]
+    assert audit_log.stats()["dropped"] == 0
+
+def test_audit_overflow_drops_when_full():
+    from app.services.audit_service import AuditLog
+
+    log = AuditLog(session_factory=None, queue_size=1, overflow="drop")
+    log.record("login_success")
+    log.record("login_success")
+    assert log.stats()["recorded"] == 1 and log.stats()["dropped"] == 1
+
+def test_audit_block_mode_never_blocks_the_event_loop():
+    import asyncio
+    import time
+    from app.services.audit_service import AuditLog
+
+    log = AuditLog(session_factory=None, queue_size=1, overflow="block", block_timeout=1.0)
+    log.record("login_success")
+
+    async def handler():
+        start = time.monotonic()
+        log.record("login_success")
+        return time.monotonic() - start
+    assert asyncio.run(handler()) < 0.5
+    assert log.stats()["dropped"] == 1
+
+def test_role_hierarchy_inherits_permissions_transitively(client, db, admin_token, user_token):
+    from app.permission_engine import permission_engine
+    from app.repositories.permission_repository import PermissionRepository
+
+    read = db.query(Permission).filter_by(name="READ_DATA").one()
+    write = db.query(Permission).filter_by(name="WRITE_DATA").one()
+    viewer, editor, lead = Role(name="Viewer", permissions=[read]), Role(name="Editor", permissions=[write]), Role(name="Lead")
+    user = db.query(User).filter_by(username="testuser").one()
+    user.roles.append(lead)
+    db.add_all([viewer, editor])
+    db.commit()
+    headers = {"Authorization": admin_token}
+
+    def link(parent, child):
+        return client.post("/admin/role-hierarchy", json={"parent_id": parent.id, "child_id": child.id}, headers=headers)
+
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 403
+    assert link(lead, editor).json() == {"status": "linked"}
+    assert link(editor, viewer).json() == {"status": "linked"}
+    assert link(viewer, lead).status_code == 409
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 200
+    assert set(PermissionRepository(db).get_effective_permissions(user.id).values()) == {"READ_DATA", "WRITE_DATA"}
+
+    # The incrementally maintained closure matches a full rebuild
+    incremental = dict(permission_engine._state.role_masks)
+    permission_engine.load(db)
+    assert permission_engine._state.role_masks == incremental
+
+    response = client.delete(f"/admin/role-hierarchy/{editor.id}/{viewer.id}", headers=headers)
+    assert response.json() == {"status": "unlinked"}
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 403
+
+def test_engine_answers_while_invalidated(db, admin_token):
+    from app.permission_engine import PermissionEngine
+
+    engine = PermissionEngine()
+    assert engine.compile(["READ_DATA"]) == 1
+    assert engine.names_for_mask(1) == []
+    assert engine.inherits(1, 1) and not engine.inherits(1, 2)
+
+    admin = db.query(User).filter_by(username="admin").one()
+    role_ids = [role.id for role in admin.roles]
+    mask = engine.user_mask(db, role_ids)
+    required = engine.compile(["ADMIN", "READ_DATA"])
+    engine.invalidate()
+    # A reload is pending: bits and names still follow the tables the mask was built on
+    assert engine.compile(["ADMIN", "READ_DATA"]) == required
+    assert set(engine.names_for_mask(mask)) == {"READ_DATA", "WRITE_DATA", "ADMIN"}
+    assert engine.inherits(role_ids[0], role_ids[0])
+    assert engine.user_mask(db, role_ids) == mask
+    assert engine.loaded
+
+def test_role_hierarchy_cycle_check_does_not_trust_a_stale_engine(client, db, admin_token):
+    from sqlalchemy import select
+    from app.models import role_hierarchy
+    from app.permission_engine import permission_engine
+
+    first, second, third = Role(name="First"), Role(name="Second"), Role(name="Third")
+    db.add_all([first, second, third])
+    db.commit()
+    headers = {"Authorization": admin_token}
+    permission_engine.load(db)
+
+    # Another worker linked Second -> First; this worker's engine has not seen it
+    db.execute(role_hierarchy.insert().values(parent_id=second.id, child_id=first.id))
+    db.commit()
+    response = client.post("/admin/role-hierarchy", json={"parent_id": first.id, "child_id": second.id}, headers=headers)
+    assert response.status_code == 409
+    assert db.execute(select(role_hierarchy).where(role_hierarchy.c.parent_id == first.id)).first() is None
+
+    # ... and another removed Third -> First after this engine saw it
+    db.execute(role_hierarchy.insert().values(parent_id=third.id, child_id=first.id))
+    db.commit()
+    permission_engine.load(db)
+    db.execute(role_hierarchy.delete().where(role_hierarchy.c.parent_id == third.id))
+    db.commit()
+    response = client.post("/admin/role-hierarchy", json={"parent_id": first.id, "child_id": third.id}, headers=headers)
+    assert response.json() == {"status": "linked"}
+    assert permission_engine.inherits(first.id, third.id) and not permission_engine.inherits(third.id, first.id)
+
+def test_policy_snapshot_serves_principals_and_swaps_on_assignment(client, db, admin_token, user_token):
+    from app.policy_snapshot import PolicyStore, policy_store
+
+    reader = Role(name="Reader", permissions=[db.query(Permission).filter_by(name="READ_DATA").one()])
+    db.add(reader)
+    db.commit()
+    user = db.query(User).filter_by(username="testuser").one()
+    policy_store.load(db)
+    before = policy_store.snapshot
+    assert policy_store.stats()["users"] == 2
+
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 403
+    client.post("/admin/assign-role", json={"user_id": user.id, "role_id": reader.id}, headers={"Authorization": admin_token})
+    assert client.get("/resource", headers={"Authorization": user_token}).status_code == 200
+    # Readers holding the old snapshot keep seeing the old, consistent version
+    assert list(before.role_ids(user.id)[1]) == []
+    assert list(policy_store.snapshot.role_ids(user.id)[1]) == [reader.id]
+    assert policy_store.principal(user.id).username == "testuser"
+
+    # Incremental updates match a full reload, across shard counts
+    fresh = PolicyStore(shards=3)
+    fresh.load(db)
+    for user_id in (user.id, 999):
+        assert fresh.snapshot.role_ids(user_id) == policy_store.snapshot.role_ids(user_id)
+
+def test_revoked_tokens_are_rejected_until_they_expire(client, db, admin_token, user_token):
+    from app.auth import create_token
+    from app.models import RevokedToken
+    from app.revocation import revocation_list
+
+    admin = db.query(User).filter_by(username="admin").one()
+    spare = f"Bearer {create_token(admin.id)}"
+    assert client.get("/resource", headers={"Authorization": admin_token}).status_code == 200
+    # Not revoked: settled by the filter alone
+    assert revocation_list.stats()["filter_hits"] == 0
+
+    response = client.post(
+        "/admin/revoke-token", json={"token": user_token.split()[1]}, headers={"Authorization": admin_token}
+    )
+    assert response.json() == {"status": "revoked"}
+    assert client.post("/auth/logout", headers={"Authorization": user_token}).status_code == 401
+
+    assert client.post("/auth/logout", headers={"Authorization": admin_token}).json() == {"status": "revoked"}
+    assert client.get("/resource", headers={"Authorization": admin_token}).status_code == 401
+    assert client.get("/resource", headers={"Authorization": spare}).status_code == 200
+
+    # Revocations of expired tokens are purged by the next revocation
+    db.query(RevokedToken).update({RevokedToken.expires_at: 0})
+    db.commit()
+    client.post("/auth/logout", headers={"Authorization": spare})
+    assert db.query(RevokedToken).count() == 1
+
+def test_unreadable_revocations_fail_closed(client, db, admin_token, monkeypatch):
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.exc import OperationalError
+    from app.database import get_db
+    from app.middleware import require_permission
+    from app.revocation import revocation_list
+
+    def unavailable():
+        raise OperationalError("SELECT", {}, Exception("database is down"))
+
+    # With no filter loaded every token needs the table
+    revocation_list.clear()
+    monkeypatch.setattr(revocation_list, "session_factory", unavailable)
+    headers = {"Authorization": admin_token}
+    response = client.get("/resource", headers=headers)
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+
+    # The same when the dependency checks the token without the middleware
+    def override_get_db():
+        yield db
+
+    probe = FastAPI()
+    probe.dependency_overrides[get_db] = override_get_db
+
+    @probe.get("/probe")
+    def probe_route(user=Depends(require_permission("READ_DATA"))):
+        return {}
+
+    with TestClient(probe) as probe_client:
+        assert probe_client.get("/probe", headers=headers).status_code == 503
+    assert not revocation_list.loaded
+
+def test_missing_revocation_filter_loads_once(client, admin_token, monkeypatch):
+    import threading
+    import time
+    from app.auth import verify_token
+    from app.revocation import revocation_list
+
+    claims = verify_token(admin_token.split()[1])
+    revocation_list.clear()
+    loads = []
+    reload = revocation_list.reload
+    def slow_reload(db=None):
+        loads.append(True)
+        time.sleep(0.05)
+        return reload(db)
+    monkeypatch.setattr(revocation_list, "reload", slow_reload)
+    threads = [threading.Thread(target=revocation_list.is_revoked, args=(claims,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert loads == [True]
+
+def test_bloom_filter_has_no_false_negatives():
+    from app.revocation import BloomFilter
+
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for index in range(1000):
+        bloom.add(f"token-{index}")
+    assert all(f"token-{index}" in bloom for index in range(1000))
+    false_positives = sum(f"other-{index}" in bloom for index in range(10000))
+    assert false_positives < 300
+
+def test_login_throttled_before_opening_a_session(client, db):
+    from app.database import get_db
+    from app.main import app
+    from app.rate_limit import LOGIN_USER_BURST
+
+    opened = []
+    def counting_get_db():
+        opened.append(1)
+        yield db
+    app.dependency_overrides[get_db] = counting_get_db
+
+    attempt = {"username": "victim", "password": "guess"}
+    for _ in range(LOGIN_USER_BURST):
+        assert client.post("/auth/login", json=attempt).status_code == 401
+    response = client.post("/auth/login", json={**attempt, "username": "VICTIM"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert len(opened) == LOGIN_USER_BURST
+
+def test_login_locked_out_for_good_sends_finite_retry_after(client, monkeypatch):
+    from app.rate_limit import MAX_RETRY_AFTER_SECONDS, login_rate_limiter
+
+    monkeypatch.setattr(login_rate_limiter, "acquire", lambda client_ip, username: float("inf"))
+    response = client.post("/auth/login", json={"username": "victim", "password": "guess"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(MAX_RETRY_AFTER_SECONDS)
+
+def test_token_buckets_refill_and_evict_idle_keys():
+    from app.rate_limit import TokenBuckets
+
+    buckets = TokenBuckets(burst=2, per_second=1, shards=1, sweep_interval=10)
+    assert buckets.acquire("a", now=0) == 0 and buckets.acquire("a", now=0) == 0
+    assert buckets.acquire("a", now=0.5) == 0.5
+    assert buckets.acquire("a", now=1.0) == 0
+    buckets.acquire("b", now=1.0)
+    assert len(buckets) == 2
+    # Both have refilled by the next sweep, so their slots are freed and reused
+    assert buckets.acquire("c", now=20) == 0
+    assert len(buckets) == 1
+    assert len(buckets._shards[0].tokens) == 2
+
+def test_client_ip_behind_trusted_proxies():
+    import ipaddress
+    from starlette.requests import Request
+    from app.rate_limit import client_ip
+
+    def request(peer, forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+    proxies = [ipaddress.ip_network("10.0.0.0/8")]
+
+    assert client_ip(request("10.0.0.5", "203.0.113.7"), []) == "10.0.0.5"
+    assert client_ip(request("10.0.0.5", "203.0.113.7"), proxies) == "203.0.113.7"
+    # A spoofed left-most entry is ignored; the hop before our proxies counts
+    assert client_ip(request("10.0.0.5", "1.1.1.1, 203.0.113.7, 10.0.0.9"), proxies) == "203.0.113.7"
+    # Clients that are not proxies cannot choose their address
+    assert client_ip(request("198.51.100.2", "203.0.113.7"), proxies) == "198.51.100.2"
+
+def test_resource_etag_changes_with_policy(client, db, admin_token, monkeypatch):
+    from app.response_cache import response_cache
+
+    monkeypatch.setattr(response_cache, "maxsize", 10)
+    headers = {"Authorization": admin_token}
+    first = client.get("/resource/", headers=headers)
+    etag = first.headers["ETag"]
+    assert first.json()["username"] == "admin"
+
+    cached = client.get("/resource/", headers=headers)
+    assert cached.content == first.content
+    assert response_cache.stats()["hits"] == 1
+
+    not_modified = client.get("/resource/", headers={**headers, "If-None-Match": f'"other", {etag}'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    # A permission change gives the caller a new ETag
+    exporter = Role(name="Exporter", permissions=[Permission(name="EXPORT_DATA")])
+    db.add(exporter)
+    db.commit()
+    admin = db.query(User).filter_by(username="admin").one()
+    client.post("/admin/assign-role", json={"user_id": admin.id, "role_id": exporter.id}, headers=headers)
+    changed = client.get("/resource/", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+def test_admin_listings_page_by_id(client, db, admin_token, user_token):
+    headers = {"Authorization": admin_token}
+    read = db.query(Permission).filter_by(name="READ_DATA").one()
+    reader, lead = Role(name="Reader", permissions=[read]), Role(name="Lead")
+    lead.children.append(reader)
+    db.add_all([User(username=f"user{index}", password="pw", roles=[lead] if index % 2 else []) for index in range(5)])
+    db.add(reader)
+    db.commit()
+
+    ids, after = [], 0
+    while after is not None:
+        page = client.get("/admin/users", params={"after": after, "limit": 2}, headers=headers).json()
+        assert len(page["items"]) <= 2
+        ids.extend(item["id"] for item in page["items"])
+        after = page["next_after"]
+    assert ids == sorted(user.id for user in db.query(User))
+
+    # READ_DATA through Admin directly, or through Lead inheriting Reader
+    holders = client.get("/admin/users", params={"permission": "READ_DATA"}, headers=headers).json()["items"]
+    assert [item["username"] for item in holders] == ["admin", "user1", "user3"]
+    assert client.get("/admin/users", params={"role_id": lead.id}, headers=headers).json()["items"][0]["role_ids"] == [lead.id]
+    roles = client.get("/admin/roles", params={"permission": "READ_DATA"}, headers=headers).json()["items"]
+    assert {role["name"] for role in roles} == {"Admin", "Reader", "Lead"}
+
+    user1 = db.query(User).filter_by(username="user1").one()
+    page = client.get(f"/admin/users/{user1.id}/permissions", headers=headers).json()
+    assert page == {"items": [{"id": read.id, "name": "READ_DATA"}], "next_after": None}
+    assert client.get("/admin/users/999/permissions", headers=headers).status_code == 404
+    assert client.get("/admin/users", headers={"Authorization": user_token}).status_code == 403
+
+def test_login_error_is_logged_not_echoed(client, db, monkeypatch, caplog):
+    from app.routes import auth_routes
+
+    def broken(session, username):
+        raise RuntimeError("connection string with a password in it")
+    monkeypatch.setattr(auth_routes, "_find_login", broken)
+    response = client.post("/auth/login", json={"username": "anyone", "password": "pw"})
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Login failed"}
+    assert "connection string" in caplog.text
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.database import Base
+from app.importer import run_import
+from app.models import User, Role, user_roles
+from app.passwords import check_password, hash_password, is_password_hash
+from app.repositories.bulk import check_dialect, dialect_insert
+
+
+def test_import_streams_csv_and_jsonl_and_is_idempotent(tmp_path):
+    (tmp_path / "roles.csv").write_text("name\nAdmin\nViewer\n")
+    hashed = hash_password("hashed-secret")
+    with open(tmp_path / "users.jsonl", "w") as users:
+        for i in range(25):
+            users.write(json.dumps({"username": f"user{i}", "password": hashed if i == 0 else "secret"}) + "\n")
+    (tmp_path / "user_roles.csv").write_text(
+        "username,role\n" + "".join(f"user{i},Viewer\n" for i in range(25)) + "ghost,Admin\n"
+    )
+    sources = {
+        "roles": str(tmp_path / "roles.csv"),
+        "users": str(tmp_path / "users.jsonl"),
+        "user_roles": str(tmp_path / "user_roles.csv"),
+    }
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    Base.metadata.create_all(bind=engine)
+
+    first = run_import(engine, sources, report=lambda line: None)
+    assert first["users"]["read"] == 25 and first["users"]["inserted"] == 25
+    assert first["user_roles"] == {**first["user_roles"], "read": 26, "inserted": 25}
+
+    second = run_import(engine, sources, report=lambda line: None)
+    assert all(entity["inserted"] == 0 for entity in second.values())
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(User)) == 25
+        assert connection.scalar(select(func.count()).select_from(Role)) == 2
+        assert connection.scalar(select(func.count()).select_from(user_roles)) == 25
+        # Plaintext is hashed on the way in, existing hashes are kept as they are
+        passwords = dict(connection.execute(select(User.username, User.password)).all())
+        assert passwords["user0"] == hashed
+        assert all(is_password_hash(password) for password in passwords.values())
+        assert check_password("secret", passwords["user1"]) == (True, None)
+    engine.dispose()
+
+
+def test_unsupported_dialect_is_rejected_up_front():
+    with pytest.raises(RuntimeError, match="mssql"):
+        check_dialect("mssql")
+    with pytest.raises(RuntimeError, match="PostgreSQL and SQLite"):
+        dialect_insert("mysql", user_roles)
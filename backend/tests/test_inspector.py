@@ -0,0 +1,38 @@
+import io
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.inspector import dump
+from app.models import User, Role, Permission
+
+
+def test_dump_streams_filtered_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'inspect.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        admin = Role(name="Admin", permissions=[Permission(name="ADMIN")])
+        viewer = Role(name="Viewer", permissions=[Permission(name="READ_DATA")])
+        db.add_all([User(username=f"user{i}", password="pw", roles=[admin if i == 3 else viewer]) for i in range(10)])
+        db.add(User(username="loner", password="pw"))
+        db.commit()
+        viewer_id = viewer.id
+
+    out = io.StringIO()
+    assert dump(engine, "user-roles", out, batch_size=3) == 11
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    loner = next(row for row in rows if row["username"] == "loner")
+    assert loner["role_id"] is None and loner["role_name"] is None
+    assert [row["user_id"] for row in rows] == sorted(row["user_id"] for row in rows)
+
+    out = io.StringIO()
+    assert dump(engine, "users", out, "csv", role="Admin", batch_size=3) == 1
+    header, line = out.getvalue().splitlines()
+    assert header == "id,username" and line.endswith(",user3")
+
+    out = io.StringIO()
+    dump(engine, "permissions", out, role=str(viewer_id))
+    assert [json.loads(line)["name"] for line in out.getvalue().splitlines()] == ["READ_DATA"]
+    engine.dispose()
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from app.models import User
+from app.passwords import PasswordPool, PasswordPoolFull, check_password, hash_password
+
+def test_plaintext_password_upgraded_on_login(client, db, user_token):
+    stored = db.query(User).filter_by(username="testuser").one().password
+    assert stored.startswith("scrypt$")
+    assert check_password("testpass", stored) == (True, None)
+
+    response = client.post("/auth/login", json={"username": "testuser", "password": "wrong"})
+    assert response.status_code == 401
+    response = client.post("/auth/login", json={"username": "testuser", "password": "testpass"})
+    assert response.status_code == 200
+
+def test_outdated_parameters_are_rehashed(monkeypatch):
+    from app import passwords
+
+    monkeypatch.setattr(passwords, "SCRYPT_N", 2 ** 10)
+    weak = hash_password("secret")
+    monkeypatch.setattr(passwords, "SCRYPT_N", 2 ** 12)
+    matches, upgraded = check_password("secret", weak)
+    assert matches and upgraded.startswith("scrypt$4096$")
+
+def test_malformed_hash_is_rejected_not_raised(client, db):
+    assert check_password("secret", "scrypt$16384$8") == (False, None)
+    assert check_password("secret", "scrypt$abc$8$1$c2FsdA==$ZGlnZXN0") == (False, None)
+    assert check_password("secret", "scrypt$16384$8$1$not base64!$ZGlnZXN0") == (False, None)
+
+    db.add(User(username="truncated", password="scrypt$16384$8$1$c2Fs"))
+    db.commit()
+    response = client.post("/auth/login", json={"username": "truncated", "password": "scrypt$16384$8$1$c2Fs"})
+    assert response.status_code == 401
+
+def test_full_pool_rejects_immediately():
+    pool = PasswordPool(workers=1, queue_limit=1)
+    release = threading.Event()
+    pool.submit(release.wait)
+    with pytest.raises(PasswordPoolFull):
+        pool.verify("secret", None)
+    release.set()
+    pool.shutdown()
+    assert pool.stats()["rejected"] == 1
+
+def test_saturated_hash_queue_leaves_threadpool_free(client, db, admin_token, monkeypatch):
+    from app import rate_limit
+    from app.database import get_db
+    from app.main import app
+    from app.routes import auth_routes
+    from conftest import TestingSessionLocal
+
+    monkeypatch.setattr(rate_limit, "LOGIN_RATE_LIMIT", False)
+    release = threading.Event()
+    # More stuck logins than anyio's 40 threadpool tokens
+    pool = PasswordPool(workers=1, queue_limit=64)
+    monkeypatch.setattr(pool, "_check_job", lambda password, stored: release.wait() and (False, None))
+    monkeypatch.setattr(auth_routes, "password_pool", pool)
+
+    def own_session():
+        session = TestingSessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+    app.dependency_overrides[get_db] = own_session
+
+    logins = [
+        threading.Thread(target=client.post, args=("/auth/login",), kwargs={"json": {"username": f"u{i}", "password": "pw"}})
+        for i in range(48)
+    ]
+    for login in logins:
+        login.start()
+    try:
+        for _ in range(100):
+            if pool.stats()["pending"] == len(logins):
+                break
+            threading.Event().wait(0.05)
+        assert pool.stats()["pending"] == len(logins)
+
+        responses = []
+        probe = threading.Thread(target=lambda: responses.append(client.get("/resource/", headers={"Authorization": admin_token})))
+        probe.start()
+        probe.join(timeout=5)
+        assert responses and responses[0].status_code == 200
+    finally:
+        release.set()
+        for login in logins:
+            login.join()
+        pool.shutdown()
@@ -0,0 +1,47 @@
+import pytest
+
+from app.models import User, Role, Permission
+from app.permission_patterns import PatternTrie
+
+def test_pattern_trie_wildcards():
+    trie = PatternTrie(["reports:*:read", "billing:**", "audit:export"])
+    assert trie.matches("reports:2024:read")
+    assert not trie.matches("reports:2024:write")
+    assert not trie.matches("reports:2024:q1:read")
+    assert trie.matches("billing")
+    assert trie.matches("billing:invoices:2024:read")
+    assert trie.matches("audit:export")
+    assert not trie.matches("audit")
+    assert PatternTrie(["**:read"]).matches("reports:2024:read")
+    assert not PatternTrie(["**:read"]).matches("reports:2024:write")
+
+def test_wildcard_grants_in_checks(client, db, admin_token, user_token):
+    from app.repositories.permission_repository import PermissionRepository
+
+    user = db.query(User).filter_by(username="testuser").one()
+    user.roles.append(Role(name="Analyst", permissions=[Permission(name="reports:*:read")]))
+    db.commit()
+
+    response = client.post(
+        "/authz/check",
+        json={"user_id": user.id, "permissions": ["reports:2024:read", "reports:2024:write", "READ_DATA"]},
+        headers={"Authorization": admin_token}
+    )
+    assert [decision["allowed"] for decision in response.json()["decisions"]] == [True, False, False]
+
+    repository = PermissionRepository(db)
+    assert repository.has_permission(user.id, "reports:2025:read")
+    assert not repository.has_permission(user.id, "reports:2025:delete")
+
+def test_requirement_falls_back_to_patterns(db):
+    from fastapi import HTTPException
+    from app.middleware import _Requirement
+    from app.permission_cache import Principal
+    from app.permission_engine import permission_engine
+
+    permission_engine.load(db)
+    user = Principal(id=1, username="analyst", mask=0, patterns=PatternTrie(["reports:**"]))
+    assert _Requirement(["reports:2024:read", "reports:export"], "all").authorize(user, "cache") is user
+    assert _Requirement(["billing:read", "reports:read"], "any").authorize(user, "cache") is user
+    with pytest.raises(HTTPException):
+        _Requirement(["billing:read", "reports:read"], "all").authorize(user, "cache")
@@ -0,0 +1,192 @@
+import multiprocessing
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Permission, Role, User
+from app.repositories.user_repository import UserRepository
+from app.services.rbac_service import RBACService
+
+INTERVAL_MS = 50
+
+
+def _worker(url: str, user_id: int, ready, changed, results):
+    """Another server process: caches the user's permissions, then waits for the change to show up"""
+    from app.permission_cache import permission_cache
+    from app.permission_engine import permission_engine
+    from app.services.policy_sync_service import PolicyWatcher
+
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    permission_cache.clear()
+    permission_engine.invalidate()
+    watcher = PolicyWatcher(session_factory=Session, interval_ms=INTERVAL_MS)
+    watcher.poll()
+
+    def can_read():
+        db = Session()
+        try:
+            principal = RBACService(UserRepository(db))._principals([user_id])[user_id]
+            return permission_engine.names_for_mask(principal.mask) == ["READ_DATA"]
+        finally:
+            db.close()
+
+    results.put(("before", can_read(), permission_cache.get(user_id) is not None))
+    ready.set()
+    changed.wait(10)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        watcher.poll()
+        if can_read():
+            results.put(("after", time.monotonic(), watcher.stats()))
+            return
+        time.sleep(0.005)
+    results.put(("after", None, watcher.stats()))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_role_change_reaches_other_process_within_poll_interval(tmp_path):
+    url = f"sqlite:///{tmp_path / 'policy.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    reader = Role(name="Reader", permissions=[Permission(name="READ_DATA")])
+    user = User(username="worker-user", password="x")
+    db.add_all([reader, user])
+    db.commit()
+
+    context = multiprocessing.get_context("fork")
+    ready, changed, results = context.Event(), context.Event(), context.Queue()
+    worker = context.Process(target=_worker, args=(url, user.id, ready, changed, results))
+    worker.start()
+    try:
+        assert ready.wait(10)
+        # The other process now serves this user from its cache
+        assert results.get(timeout=5) == ("before", False, True)
+
+        RBACService(UserRepository(db)).assign_roles([(user.id, reader.id)])
+        committed = time.monotonic()
+        changed.set()
+
+        _, seen_at, stats = results.get(timeout=10)
+        assert seen_at is not None
+        # One poll interval, plus generous slack for process scheduling
+        assert seen_at - committed < INTERVAL_MS / 1000 + 1.0
+        assert stats["selective"] == 1 and stats["full"] == 0
+    finally:
+        worker.join(10)
+        db.close()
+        engine.dispose()
+
+
+def test_record_change_seeds_the_counter_row(tmp_path):
+    from sqlalchemy import insert
+    from app.models import PolicyVersion
+    from app.repositories.policy_repository import PolicyRepository
+
+    for seeded in (False, True):
+        engine = create_engine(f"sqlite:///{tmp_path / f'version-{seeded}.db'}")
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            if seeded:
+                # As created by setup_db.py
+                db.execute(insert(PolicyVersion).values(id=1, version=0))
+            assert PolicyRepository(db).current_version() == 0
+            assert PolicyRepository(db).record_change([(1, 2)]) == 1
+            assert PolicyRepository(db).record_change() == 2
+            assert PolicyRepository(db).changes_since(0) == [(1, 1, 2), (2, None, None)]
+
+
+def test_full_reload_runs_off_the_polling_request(tmp_path, monkeypatch):
+    import threading
+    from app.permission_engine import permission_engine
+    from app.repositories.policy_repository import PolicyRepository
+    from app.services.policy_sync_service import PolicyWatcher
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'reload.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    watcher = PolicyWatcher(session_factory=Session, interval_ms=1)
+    watcher.poll()
+
+    release = threading.Event()
+    load = permission_engine.load
+    monkeypatch.setattr(permission_engine, "load", lambda db: release.wait(5) and load(db))
+    with Session() as db:
+        PolicyRepository(db).record_change()
+        db.commit()
+
+    time.sleep(0.01)
+    start = time.monotonic()
+    watcher.poll()
+    assert time.monotonic() - start < 1
+    assert watcher.stats()["full"] == 1 and watcher.stats()["reloading"]
+    assert not permission_engine.loaded
+
+    release.set()
+    watcher.wait_for_reload(5)
+    assert permission_engine.loaded and not watcher.stats()["reloading"]
+
+
+def test_permission_checks_survive_background_reloads(tmp_path, monkeypatch):
+    import sys
+    import threading
+    from fastapi import HTTPException
+    from app.middleware import _Requirement, load_principal
+    from app.permission_engine import permission_engine
+    from app.services.audit_service import audit_log
+    from app.services.policy_sync_service import PolicyWatcher
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'checks.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        user = User(username="reader", password="x", roles=[Role(name="Reader", permissions=[Permission(name="READ_DATA")])])
+        db.add_all([user, Permission(name="ADMIN")])
+        db.commit()
+        user_id = user.id
+
+    monkeypatch.setattr(audit_log, "record", lambda *args, **kwargs: None)
+    watcher = PolicyWatcher(session_factory=Session, interval_ms=0)
+    granted, withheld = _Requirement("READ_DATA", "all"), _Requirement("ADMIN", "all")
+    stop, errors = threading.Event(), []
+
+    def check():
+        # What require_permission does once it has to load the principal
+        try:
+            while not stop.is_set():
+                with Session() as db:
+                    principal = load_principal(db, user_id)
+                for _ in range(500):
+                    granted.authorize(principal, "db")
+                    with pytest.raises(HTTPException) as denied:
+                        withheld.authorize(principal, "db")
+                    assert denied.value.status_code == 403
+        except BaseException as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=check) for _ in range(4)]
+    # Switch threads often, so checks land between an invalidation and the reload
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    for thread in threads:
+        thread.start()
+    try:
+        # Full reloads on the background thread, and the invalidation a failed one falls back to
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            watcher._start_reload()
+            permission_engine.invalidate()
+            time.sleep(0.0005)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(5)
+        sys.setswitchinterval(switch_interval)
+        watcher.wait_for_reload(5)
+        engine.dispose()
+    assert errors == []
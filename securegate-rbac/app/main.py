@@ -1,7 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from .database import engine, Base
+from .database import async_engine, engine, Base
+from .passwords import password_pool
 from .routes import auth_routes, admin_routes
 
 # Create database tables on startup
@@ -9,6 +10,9 @@ from .routes import auth_routes, admin_routes
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     yield
+    password_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 app = FastAPI(title="SecureGate RBAC System", lifespan=lifespan)
 
@@ -1,46 +1,62 @@
+from dataclasses import dataclass
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
-from .database import SessionLocal, get_db
-from .models import User
+from .database import get_session, run_db
 from .auth import SECRET_KEY, ALGORITHM
+from .repositories.user_repo import UserRepository
+from .repositories.role_repo import RoleRepository
+from .services.rbac_service import RBACService
 
 bearer = HTTPBearer()
 
-def require_permission(permission_name: str):
-    def checker(credentials = Depends(bearer), db: Session = Depends(get_db)):
-        try:
-            token = credentials.credentials if credentials else None
-            if not token:
-                raise HTTPException(status_code=401, detail="Invalid token")
-                
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = int(payload.get("sub"))
-            if user_id is None:
-                raise HTTPException(status_code=401, detail="Invalid token")
-            
-            user = db.query(User).filter(User.id == user_id).first()
-            if user is None:
-                raise HTTPException(status_code=401, detail="Invalid token")
-                
-        except (JWTError, ValueError, TypeError):
+def _token_user_id(credentials) -> int:
+    try:
+        token = credentials.credentials if credentials else None
+        if not token:
             raise HTTPException(status_code=401, detail="Invalid token")
-        except HTTPException:
-            raise
-
-        permissions = {
-            p.name
-            for role in user.roles
-            for p in role.permissions
-        }
-
-        if permission_name not in permissions:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Permission denied"
-            )
-
-        return user
+
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = int(payload.get("sub"))
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return user_id
+
+    except (JWTError, ValueError, TypeError):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+@dataclass(frozen=True)
+class Principal:
+    """The authorized user: its id, username and role ids, without the ORM object"""
+    id: int
+    username: str
+    role_ids: tuple
+
+def _authorize(db: Session, user_id: int, permission_names: list, require_all: bool) -> Principal:
+    user_repo = UserRepository(db)
+    found = user_repo.get_username_and_role_ids(user_id)
+    if found is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    username, role_ids = found
+
+    rbac = RBACService(user_repo, RoleRepository(db))
+    if not rbac.check_role_permissions(role_ids, permission_names, require_all):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Permission denied"
+        )
+
+    return Principal(id=user_id, username=username, role_ids=tuple(role_ids))
+
+def require_permission(permission_name, match: str = "all"):
+    if match not in ("all", "any"):
+        raise ValueError(f"match must be 'all' or 'any', not {match!r}")
+    permission_names = [permission_name] if isinstance(permission_name, str) else list(permission_name)
+    require_all = match == "all"
+
+    async def checker(credentials = Depends(bearer), db = Depends(get_session)):
+        user_id = _token_user_id(credentials)
+        return await run_db(db, lambda session: _authorize(session, user_id, permission_names, require_all))
 
     return checker
@@ -18,6 +18,14 @@ role_permissions = Table(
     Column('permission_id', Integer, ForeignKey('permission.id'), primary_key=True)
 )
 
+# parent_id inherits every permission of child_id, e.g. Admin -> Editor -> Viewer
+role_hierarchy = Table(
+    'role_hierarchy',
+    Base.metadata,
+    Column('parent_id', Integer, ForeignKey('role.id'), primary_key=True),
+    Column('child_id', Integer, ForeignKey('role.id'), primary_key=True)
+)
+
 class User(Base):
     __tablename__ = "user"
 
@@ -35,6 +43,13 @@ class Role(Base):
     
     users = relationship("User", secondary=user_roles, back_populates="roles")
     permissions = relationship("Permission", secondary=role_permissions, back_populates="roles")
+    children = relationship(
+        "Role",
+        secondary=role_hierarchy,
+        primaryjoin=lambda: Role.id == role_hierarchy.c.parent_id,
+        secondaryjoin=lambda: Role.id == role_hierarchy.c.child_id,
+        backref="parents",
+    )
 
 class Permission(Base):
     __tablename__ = "permission"
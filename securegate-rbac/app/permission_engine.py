@@ -0,0 +1,297 @@
+import threading
+import time
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .models import Role, Permission, role_hierarchy, role_permissions
+from .permission_patterns import PatternTrie, is_pattern
+
+
+class _EngineState:
+    """Immutable lookup tables; replaced as a whole on every reload or hierarchy change"""
+
+    __slots__ = ("version", "bits", "names", "direct_masks", "children", "closure", "role_masks", "pattern_mask", "tries")
+
+    def __init__(self, version: int, bits: dict, names: tuple, direct_masks: dict, children: dict, closure: dict):
+        self.version = version
+        self.bits = bits
+        self.names = names
+        # Permissions granted to each role itself
+        self.direct_masks = direct_masks
+        # {parent role: frozenset of the roles it directly inherits from}
+        self.children = children
+        # {role: frozenset of itself and every role it inherits from, at any depth}
+        self.closure = closure
+        # Effective mask per role: the OR of the direct masks over its closure
+        self.role_masks = {
+            role_id: _combined_mask(direct_masks, reachable) for role_id, reachable in closure.items()
+        }
+        # Bits of permissions whose names are wildcard patterns
+        self.pattern_mask = 0
+        for bit, name in enumerate(names):
+            if is_pattern(name):
+                self.pattern_mask |= 1 << bit
+        # Compiled PatternTrie per distinct set of granted pattern bits
+        self.tries = {}
+
+
+def _combined_mask(direct_masks: dict, role_ids) -> int:
+    mask = 0
+    for role_id in role_ids:
+        mask |= direct_masks.get(role_id, 0)
+    return mask
+
+
+def _transitive_closure(role_ids, children: dict, known: dict = None) -> dict:
+    """
+    {role: frozenset of reachable roles} for `role_ids` by memoised DFS.
+    Entries of `known` are trusted and reused. An edge that would close a
+    cycle is ignored rather than looping.
+    """
+    closure = dict(known or {})
+
+    def visit(role_id, path):
+        found = closure.get(role_id)
+        if found is not None:
+            return found
+        path.add(role_id)
+        reachable = {role_id}
+        for child_id in children.get(role_id, ()):
+            if child_id not in path:
+                reachable |= visit(child_id, path)
+        path.discard(role_id)
+        closure[role_id] = frozenset(reachable)
+        return closure[role_id]
+
+    for role_id in role_ids:
+        visit(role_id, set())
+    return closure
+
+
+class PermissionEngine:
+    """
+    Bitset permission evaluation.
+    Every Permission.id gets a bit position, every Role a precomputed mask of
+    its permission bits, and a user's effective permissions are the OR of its
+    role masks. A permission check is then a single AND.
+    Role inheritance is folded into the role masks through a precomputed
+    transitive closure, so hierarchy depth never reaches the check itself.
+    """
+
+    def __init__(self):
+        self._state = None
+        # The last tables built, kept through invalidate(): every mask in
+        # circulation was computed against them, so bit positions and names
+        # still resolve while a reload is pending
+        self._last_state = None
+        self._lock = threading.Lock()
+        self._version = 0
+        # Seeded from the clock so versions handed out before a restart never
+        # match the ones handed out after it
+        self._policy_version = time.time_ns() // 1000
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    @property
+    def version(self) -> int:
+        """Changes whenever bit positions or role masks are rebuilt"""
+        state = self._state
+        return state.version if state is not None else 0
+
+    @property
+    def policy_version(self) -> int:
+        """Changes on every reload and every role or permission assignment change"""
+        return self._policy_version
+
+    def bump_policy_version(self):
+        with self._lock:
+            self._policy_version += 1
+
+    def load(self, db: Session) -> "_EngineState":
+        """Rebuild bit positions and role masks from the database"""
+        permissions = db.execute(select(Permission.id, Permission.name).order_by(Permission.id)).all()
+        grants = db.execute(select(role_permissions.c.role_id, role_permissions.c.permission_id)).all()
+        role_ids = db.execute(select(Role.id)).scalars().all()
+        edges = db.execute(select(role_hierarchy.c.parent_id, role_hierarchy.c.child_id)).all()
+
+        bit_for_id = {permission_id: bit for bit, (permission_id, _) in enumerate(permissions)}
+        direct_masks = dict.fromkeys(role_ids, 0)
+        for role_id, permission_id in grants:
+            bit = bit_for_id.get(permission_id)
+            if bit is not None and role_id is not None:
+                direct_masks[role_id] = direct_masks.get(role_id, 0) | (1 << bit)
+
+        children = {}
+        for parent_id, child_id in edges:
+            children.setdefault(parent_id, set()).add(child_id)
+        children = {parent_id: frozenset(child_ids) for parent_id, child_ids in children.items()}
+
+        with self._lock:
+            self._version += 1
+            self._policy_version += 1
+            state = self._state = self._last_state = _EngineState(
+                version=self._version,
+                bits={name: bit for bit, (_, name) in enumerate(permissions)},
+                names=tuple(name for _, name in permissions),
+                direct_masks=direct_masks,
+                children=children,
+                closure=_transitive_closure(direct_masks, children),
+            )
+        return state
+
+    def ensure_loaded(self, db: Session) -> "_EngineState":
+        state = self._state
+        return state if state is not None else self.load(db)
+
+    def _tables(self):
+        """The current tables, or the last ones built while they are invalidated"""
+        state = self._state
+        return state if state is not None else self._last_state
+
+    def invalidate(self):
+        """Drop the tables; the next ensure_loaded() rebuilds them"""
+        with self._lock:
+            self._state = None
+            self._policy_version += 1
+
+    def inherits(self, role_id: int, other_id: int) -> bool:
+        """Whether `role_id` is `other_id` or inherits from it at any depth"""
+        state = self._tables()
+        if state is None:
+            return role_id == other_id
+        return other_id in state.closure.get(role_id, (role_id,))
+
+    def _replace_hierarchy(self, state: _EngineState, children: dict, closure: dict):
+        # Callers hold the lock. Bumping the version makes cached principals
+        # and compiled requirements refresh their masks.
+        self._version += 1
+        self._policy_version += 1
+        self._state = self._last_state = _EngineState(
+            version=self._version,
+            bits=state.bits,
+            names=state.names,
+            direct_masks=state.direct_masks,
+            children=children,
+            closure=closure,
+        )
+
+    def add_inheritance(self, parent_id: int, child_id: int):
+        """
+        Make `parent_id` inherit `child_id` after the edge was committed.
+        Only the parent and its ancestors are touched: each gains the
+        child's closure. Raises ValueError if the edge would create a cycle.
+        """
+        with self._lock:
+            state = self._state
+            if state is None:
+                return
+            if parent_id not in state.closure or child_id not in state.closure:
+                # A role was created since the tables were built
+                self._state = None
+                return
+            if parent_id in state.closure[child_id]:
+                raise ValueError(f"Role {child_id} already inherits from role {parent_id}")
+            children = dict(state.children)
+            children[parent_id] = children.get(parent_id, frozenset()) | {child_id}
+            inherited = state.closure[child_id]
+            closure = {
+                role_id: reachable | inherited if parent_id in reachable else reachable
+                for role_id, reachable in state.closure.items()
+            }
+            self._replace_hierarchy(state, children, closure)
+
+    def remove_inheritance(self, parent_id: int, child_id: int):
+        """Drop an edge after it was deleted, recomputing only the parent and its ancestors"""
+        with self._lock:
+            state = self._state
+            if state is None or child_id not in state.children.get(parent_id, ()):
+                return
+            children = dict(state.children)
+            children[parent_id] = children[parent_id] - {child_id}
+            affected = [role_id for role_id, reachable in state.closure.items() if parent_id in reachable]
+            unaffected = {
+                role_id: reachable for role_id, reachable in state.closure.items() if parent_id not in reachable
+            }
+            self._replace_hierarchy(state, children, _transitive_closure(affected, children, unaffected))
+
+    def compile(self, permission_names) -> int:
+        """
+        Build the mask for a set of permission names.
+        Names the engine has never seen get bits above every known permission,
+        so no user mask can contain them: all-of checks fail and any-of checks
+        ignore them without special casing.
+        """
+        state = self._tables()
+        bits = state.bits if state is not None else {}
+        mask = 0
+        unknown = len(bits)
+        for name in sorted(permission_names):
+            bit = bits.get(name)
+            if bit is None:
+                bit = unknown
+                unknown += 1
+            mask |= 1 << bit
+        return mask
+
+    def user_mask(self, db: Session, role_ids) -> int:
+        """OR together the precomputed masks of the given roles"""
+        role_masks = self.ensure_loaded(db).role_masks
+        if any(role_id not in role_masks for role_id in role_ids):
+            # A role was created since the tables were built
+            role_masks = self.load(db).role_masks
+        mask = 0
+        for role_id in role_ids:
+            mask |= role_masks.get(role_id, 0)
+        return mask
+
+    def mask_for_roles(self, role_ids):
+        """
+        Like user_mask but never touches the database: None if the tables
+        are not loaded or one of the roles is unknown to them.
+        """
+        state = self._state
+        if state is None:
+            return None
+        role_masks = state.role_masks
+        mask = 0
+        for role_id in role_ids:
+            role_mask = role_masks.get(role_id)
+            if role_mask is None:
+                return None
+            mask |= role_mask
+        return mask
+
+    def patterns_for_mask(self, mask: int):
+        """
+        PatternTrie of the wildcard permissions in `mask`, or None if it has
+        none. Compiled once per distinct set of patterns and shared by every
+        principal holding it.
+        """
+        state = self._tables()
+        granted = mask & state.pattern_mask if state is not None else 0
+        if not granted:
+            return None
+        trie = state.tries.get(granted)
+        if trie is None:
+            trie = state.tries[granted] = PatternTrie(
+                name for bit, name in enumerate(state.names) if granted >> bit & 1
+            )
+        return trie
+
+    def names_for_mask(self, mask: int) -> list:
+        state = self._tables()
+        if state is None:
+            return []
+        return [name for bit, name in enumerate(state.names) if mask >> bit & 1]
+
+    @staticmethod
+    def has_all(mask: int, required: int) -> bool:
+        return mask & required == required
+
+    @staticmethod
+    def has_any(mask: int, required: int) -> bool:
+        return mask & required != 0
+
+
+permission_engine = PermissionEngine()
@@ -0,0 +1,77 @@
+"""
+Hierarchical permission patterns.
+
+Permission names are split into segments on ":" (e.g. reports:2024:read).
+A granted permission may use wildcards in place of segments:
+
+    *     exactly one segment        reports:*:read  matches reports:2024:read
+    **    zero or more segments      reports:**      matches reports, reports:2024:read
+
+A user's patterns are compiled into a PatternTrie once, and a concrete name
+is matched in one pass over its segments, however many patterns there are.
+"""
+
+SEPARATOR = ":"
+ANY_SEGMENT = "*"
+ANY_SEGMENTS = "**"
+
+
+def is_pattern(name: str) -> bool:
+    return ANY_SEGMENT in name
+
+
+class _Node:
+    __slots__ = ("children", "terminal", "repeats")
+
+    def __init__(self, repeats: bool = False):
+        self.children = {}
+        self.terminal = False
+        # Reached through "**": may keep consuming segments
+        self.repeats = repeats
+
+
+class PatternTrie:
+    """Segment trie of permission patterns, matched as an NFA over the name's segments"""
+
+    def __init__(self, patterns=()):
+        self._root = _Node()
+        self.patterns = []
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str):
+        node = self._root
+        for segment in pattern.split(SEPARATOR):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _Node(repeats=segment == ANY_SEGMENTS)
+            node = child
+        node.terminal = True
+        self.patterns.append(pattern)
+
+    @staticmethod
+    def _with_empty_matches(nodes: list) -> list:
+        """Add the "**" children of every node, since "**" may match no segment at all"""
+        index = 0
+        while index < len(nodes):
+            globstar = nodes[index].children.get(ANY_SEGMENTS)
+            if globstar is not None and globstar not in nodes:
+                nodes.append(globstar)
+            index += 1
+        return nodes
+
+    def matches(self, name: str) -> bool:
+        live = self._with_empty_matches([self._root])
+        for segment in name.split(SEPARATOR):
+            following = []
+            for node in live:
+                if node.repeats:
+                    following.append(node)
+                for key in (segment, ANY_SEGMENT):
+                    child = node.children.get(key)
+                    if child is not None:
+                        following.append(child)
+            if not following:
+                return False
+            live = self._with_empty_matches(list(dict.fromkeys(following)))
+        return any(node.terminal for node in live)
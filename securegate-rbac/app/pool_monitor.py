@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+POOL_STATS_INTERVAL = float(os.getenv("DB_POOL_STATS_INTERVAL", "10"))
+POOL_STATS_HISTORY = int(os.getenv("DB_POOL_STATS_HISTORY", "360"))
+
+
+def pool_options(url: str) -> dict:
+    """
+    create_engine() pool arguments from the environment.
+    Size, overflow and timeout only apply to queue pools (PostgreSQL, file
+    SQLite); recycle and pre-ping apply to every pool.
+    """
+    options = {
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "-1")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes"),
+    }
+    parsed = make_url(url)
+    if issubclass(parsed.get_dialect().get_pool_class(parsed), QueuePool):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+    return options
+
+
+class PoolMonitor:
+    """
+    Live connection pool statistics.
+    Checkout waits are timed by the pool class from monitored_pool_class();
+    checkins, new connections and invalidations come from pool events.
+    Activity is also rolled up into fixed-length intervals so the endpoint
+    can show how the pool behaved over time.
+    """
+
+    def __init__(self, name: str, interval: float = POOL_STATS_INTERVAL, history: int = POOL_STATS_HISTORY):
+        self.name = name
+        self.interval = interval
+        self.pool = None
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)
+        self._totals = {"checkouts": 0, "checkins": 0, "connects": 0, "invalidations": 0, "timeouts": 0}
+        self._bucket = self._new_bucket(time.time())
+
+    def _new_bucket(self, now: float) -> dict:
+        return {
+            "start": now - now % self.interval,
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_total_ms": 0.0,
+            "wait_max_ms": 0.0,
+            "checked_out_max": 0,
+            "overflow_max": 0,
+        }
+
+    def _current_bucket(self) -> dict:
+        now = time.time()
+        if now - self._bucket["start"] >= self.interval:
+            self._history.append(self._close_bucket(self._bucket))
+            self._bucket = self._new_bucket(now)
+        return self._bucket
+
+    @staticmethod
+    def _close_bucket(bucket: dict) -> dict:
+        closed = dict(bucket)
+        wait_total_ms = closed.pop("wait_total_ms")
+        closed["wait_avg_ms"] = wait_total_ms / bucket["checkouts"] if bucket["checkouts"] else 0.0
+        return closed
+
+    def attach(self, engine):
+        """Listen to the engine's pool events"""
+        self.pool = engine.pool
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def record_checkout(self, wait: float, pool):
+        checked_out = pool.checkedout() if isinstance(pool, QueuePool) else 0
+        overflow = max(pool.overflow(), 0) if isinstance(pool, QueuePool) else 0
+        wait_ms = wait * 1000
+        with self._lock:
+            self._totals["checkouts"] += 1
+            bucket = self._current_bucket()
+            bucket["checkouts"] += 1
+            bucket["wait_total_ms"] += wait_ms
+            bucket["wait_max_ms"] = max(bucket["wait_max_ms"], wait_ms)
+            bucket["checked_out_max"] = max(bucket["checked_out_max"], checked_out)
+            bucket["overflow_max"] = max(bucket["overflow_max"], overflow)
+
+    def record_timeout(self, wait: float):
+        with self._lock:
+            self._totals["timeouts"] += 1
+            bucket = self._current_bucket()
+            bucket["timeouts"] += 1
+            bucket["wait_max_ms"] = max(bucket["wait_max_ms"], wait * 1000)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._totals["checkins"] += 1
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._totals["connects"] += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self._totals["invalidations"] += 1
+
+    def stats(self) -> dict:
+        pool = self.pool
+        current = {"pool_class": type(pool).__name__ if pool is not None else None}
+        if isinstance(pool, QueuePool):
+            current.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+                timeout=pool.timeout(),
+            )
+        with self._lock:
+            bucket = self._current_bucket()
+            history = list(self._history) + [self._close_bucket(bucket)]
+            return {"name": self.name, "current": current, "totals": dict(self._totals), "history": history}
+
+
+def monitored_pool_class(url: str, monitor: PoolMonitor):
+    """
+    Subclass the pool create_engine() would pick for `url` so every checkout
+    reports how long it waited for a connection, including timeouts.
+    """
+    parsed = make_url(url)
+    base = parsed.get_dialect().get_pool_class(parsed)
+
+    class MonitoredPool(base):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except exc.TimeoutError:
+                monitor.record_timeout(time.perf_counter() - start)
+                raise
+            monitor.record_checkout(time.perf_counter() - start, self)
+            return connection
+
+    MonitoredPool.__name__ = f"Monitored{base.__name__}"
+    return MonitoredPool
@@ -6,7 +6,7 @@ class RoleRepository:
         self.db = db
 
     def get_role_by_id(self, role_id: int) -> Role:
-        return self.db.query(Role).get(role_id)
+        return self.db.get(Role, role_id)
 
     def get_role_by_name(self, name: str) -> Role:
         return self.db.query(Role).filter_by(name=name).first()
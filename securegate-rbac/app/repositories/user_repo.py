@@ -1,5 +1,6 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..models import User
+from ..models import User, user_roles
 
 class UserRepository:
     def __init__(self, db: Session):
@@ -9,4 +10,20 @@ class UserRepository:
         return self.db.query(User).filter_by(username=username).first()
 
     def get_user_by_id(self, user_id: int) -> User:
-        return self.db.query(User).get(user_id)
+        return self.db.get(User, user_id)
+
+    def get_username_and_role_ids(self, user_id: int):
+        """(username, [role ids]) in one round trip, or None if the user does not exist"""
+        rows = self.db.execute(
+            select(User.username, user_roles.c.role_id)
+            .outerjoin(user_roles, user_roles.c.user_id == User.id)
+            .where(User.id == user_id)
+        ).all()
+        if not rows:
+            return None
+        return rows[0].username, [role_id for _, role_id in rows if role_id is not None]
+
+    def get_role_ids(self, user_id: int) -> list:
+        return self.db.execute(
+            select(user_roles.c.role_id).where(user_roles.c.user_id == user_id)
+        ).scalars().all()
@@ -1,21 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from ..middleware import require_permission, get_db
-from ..models import User, Role
+from ..database import ASYNC_DB, async_pool_monitor, get_session, pool_monitor, run_db
+from ..middleware import require_permission
+from ..models import User, Role, user_roles
 from ..schemas import AssignRoleRequest, StatusResponse
 
 router = APIRouter()
 
+def _assign_role(db: Session, user_id: int, role_id: int) -> bool:
+    user = db.get(User, user_id)
+    role = db.get(Role, role_id)
+    if not user or not role:
+        return False
+    db.execute(insert(user_roles).values(user_id=user.id, role_id=role.id))
+    db.commit()
+    return True
+
 @router.post("/assign-role", response_model=StatusResponse)
-def assign_role(
+async def assign_role(
     request: AssignRoleRequest,
-    db: Session = Depends(get_db),
+    db=Depends(get_session),
     admin=Depends(require_permission("ADMIN"))
 ):
-    user = db.query(User).get(request.user_id)
-    role = db.query(Role).get(request.role_id)
-    if not user or not role:
+    if not await run_db(db, lambda session: _assign_role(session, request.user_id, request.role_id)):
         raise HTTPException(status_code=404, detail="User or Role not found")
-    user.roles.append(role)
-    db.commit()
     return {"status": "Role assigned"}
+
+@router.get("/db-pool")
+def db_pool_stats(admin=Depends(require_permission("ADMIN"))):
+    """Connection pool occupancy, overflow and checkout waits over time"""
+    stats = {"sync": pool_monitor.stats()}
+    if ASYNC_DB:
+        stats["async"] = async_pool_monitor.stats()
+    return stats
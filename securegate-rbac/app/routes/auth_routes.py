@@ -1,15 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from ..middleware import get_db
+from ..database import get_session, run_db
 from ..models import User
 from ..auth import create_token
+from ..passwords import PasswordPoolFull, password_pool
 from ..schemas import LoginRequest, TokenResponse
 
 router = APIRouter()
 
+def _login_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many concurrent logins, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+def _find_login(db: Session, username: str):
+    """(id, password) of the user, or None"""
+    return db.execute(select(User.id, User.password).where(User.username == username)).first()
+
+def _store_password(db: Session, user_id: int, password: str):
+    db.execute(update(User).where(User.id == user_id).values(password=password))
+    db.commit()
+
 @router.post("/login", response_model=TokenResponse)
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter_by(username=request.username, password=request.password).first()
-    if not user:
+async def login(request: LoginRequest, db=Depends(get_session)):
+    # Async so that waiting on the hashing pool holds no threadpool thread;
+    # only the short database steps go through run_db.
+    user = await run_db(db, lambda session: _find_login(session, request.username))
+    try:
+        valid, upgraded = await password_pool.verify_async(request.password, user.password if user else None)
+    except PasswordPoolFull:
+        raise _login_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if upgraded:
+        await run_db(db, lambda session: _store_password(session, user.id, upgraded))
     return {"token": create_token(user.id)}
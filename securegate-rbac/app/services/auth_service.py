@@ -1,12 +1,20 @@
+from starlette.concurrency import run_in_threadpool
 from ..repositories.user_repo import UserRepository
 from ..auth import create_token
+from ..passwords import password_pool
 
 class AuthService:
     def __init__(self, user_repo: UserRepository):
         self.user_repo = user_repo
 
-    def authenticate_user(self, username: str, password: str) -> str:
-        user = self.user_repo.get_user_by_username(username)
-        if user and user.password == password:  # In production, hash passwords
-            return create_token(user.id)
-        return None
+    async def authenticate_user(self, username: str, password: str) -> str:
+        # The repository is sync: its queries run in the threadpool, while
+        # the hash check waits on the hashing pool without holding a thread
+        user = await run_in_threadpool(self.user_repo.get_user_by_username, username)
+        valid, upgraded = await password_pool.verify_async(password, user.password if user else None)
+        if not valid:
+            return None
+        if upgraded:
+            user.password = upgraded
+            await run_in_threadpool(self.user_repo.db.commit)
+        return create_token(user.id)
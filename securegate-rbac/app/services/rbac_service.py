@@ -1,10 +1,20 @@
 from ..repositories.user_repo import UserRepository
 from ..repositories.role_repo import RoleRepository
+from ..repositories.permission_repo import PermissionRepository
+from ..permission_engine import PermissionEngine, permission_engine
 
 class RBACService:
-    def __init__(self, user_repo: UserRepository, role_repo: RoleRepository):
+    def __init__(
+        self,
+        user_repo: UserRepository,
+        role_repo: RoleRepository,
+        engine: PermissionEngine = permission_engine,
+        permission_repo: PermissionRepository = None,
+    ):
         self.user_repo = user_repo
         self.role_repo = role_repo
+        self.engine = engine
+        self.permission_repo = permission_repo or PermissionRepository(user_repo.db)
 
     def assign_role_to_user(self, user_id: int, role_id: int) -> bool:
         user = self.user_repo.get_user_by_id(user_id)
@@ -14,9 +24,23 @@ class RBACService:
             return True
         return False
 
+    def get_permission_mask(self, user_id: int) -> int:
+        role_ids = self.user_repo.get_role_ids(user_id)
+        return self.engine.user_mask(self.user_repo.db, role_ids)
+
     def check_permission(self, user_id: int, permission_name: str) -> bool:
-        user = self.user_repo.get_user_by_id(user_id)
-        if user:
-            permissions = {p.name for role in user.roles for p in role.permissions}
-            return permission_name in permissions
-        return False
+        return self.permission_repo.has_permission(user_id, permission_name)
+
+    def get_effective_permissions(self, user_id: int) -> set:
+        return set(self.permission_repo.get_effective_permissions(user_id).values())
+
+    def check_permissions(self, user_id: int, permission_names, require_all: bool = True) -> bool:
+        return self.check_role_permissions(self.user_repo.get_role_ids(user_id), permission_names, require_all)
+
+    def check_role_permissions(self, role_ids, permission_names, require_all: bool = True) -> bool:
+        """check_permissions for a user whose role ids are already loaded"""
+        mask = self.engine.user_mask(self.user_repo.db, role_ids)
+        required = self.engine.compile(permission_names)
+        if require_all:
+            return self.engine.has_all(mask, required)
+        return self.engine.has_any(mask, required)
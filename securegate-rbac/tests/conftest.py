@@ -10,6 +10,7 @@ os.environ['DATABASE_URL'] = "sqlite:///:memory:"
 from app.database import Base
 from app.main import app
 from app.database import get_db
+from app.permission_engine import permission_engine
 
 # Create test database
 engine = create_engine(
@@ -38,6 +39,7 @@ def client(db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    permission_engine.invalidate()
     
     from fastapi.testclient import TestClient
     with TestClient(app) as test_client:
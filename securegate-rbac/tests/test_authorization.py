@@ -20,3 +20,63 @@ def test_permission_denied(client, user_token):
         headers={"Authorization": user_token}
     )
     assert response.status_code == 403
+
+def test_rbac_service_permission_queries(db):
+    from app.repositories.user_repo import UserRepository
+    from app.repositories.role_repo import RoleRepository
+    from app.services.rbac_service import RBACService
+
+    read, write = Permission(name="READ_DATA"), Permission(name="WRITE_DATA")
+    user = User(username="editor", password="pw", roles=[Role(name="Editor", permissions=[read, write])])
+    db.add_all([user, Permission(name="ADMIN")])
+    db.commit()
+
+    rbac = RBACService(UserRepository(db), RoleRepository(db))
+    assert rbac.check_permission(user.id, "WRITE_DATA")
+    assert not rbac.check_permission(user.id, "ADMIN")
+    assert rbac.get_effective_permissions(user.id) == {"READ_DATA", "WRITE_DATA"}
+    assert rbac.check_permissions(user.id, ["ADMIN", "READ_DATA"], require_all=False)
+    assert not rbac.check_permissions(user.id, ["ADMIN", "READ_DATA"])
+    assert UserRepository(db).get_username_and_role_ids(user.id) == ("editor", [user.roles[0].id])
+    assert UserRepository(db).get_username_and_role_ids(999) is None
+
+def test_inherited_role_permissions(db):
+    from app.permission_engine import permission_engine
+    from app.repositories.user_repo import UserRepository
+    from app.repositories.role_repo import RoleRepository
+    from app.services.rbac_service import RBACService
+
+    viewer = Role(name="Viewer", permissions=[Permission(name="READ_DATA")])
+    editor = Role(name="Editor", permissions=[Permission(name="WRITE_DATA")], children=[viewer])
+    admin = Role(name="Admin", children=[editor])
+    user = User(username="lead", password="pw", roles=[admin])
+    db.add(user)
+    db.commit()
+
+    permission_engine.invalidate()
+    rbac = RBACService(UserRepository(db), RoleRepository(db))
+    assert rbac.check_permission(user.id, "READ_DATA")
+    assert rbac.check_permissions(user.id, ["READ_DATA", "WRITE_DATA"])
+
+    permission_engine.remove_inheritance(editor.id, viewer.id)
+    assert not rbac.check_permissions(user.id, ["READ_DATA"])
+    permission_engine.add_inheritance(editor.id, viewer.id)
+    assert rbac.check_permissions(user.id, ["READ_DATA"])
+    with pytest.raises(ValueError):
+        permission_engine.add_inheritance(viewer.id, admin.id)
+
+def test_assign_role(client, db):
+    admin_role = Role(name="Admin", permissions=[Permission(name="ADMIN")])
+    db.add_all([User(username="root", password="rootpass", roles=[admin_role]), User(username="alice", password="pw")])
+    db.commit()
+    alice = db.query(User).filter_by(username="alice").one()
+    token = client.post("/auth/login", json={"username": "root", "password": "rootpass"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post("/admin/assign-role", json={"user_id": alice.id, "role_id": admin_role.id}, headers=headers)
+    assert response.status_code == 200
+    db.expire_all()
+    assert [role.name for role in alice.roles] == ["Admin"]
+
+    response = client.post("/admin/assign-role", json={"user_id": 999, "role_id": admin_role.id}, headers=headers)
+    assert response.status_code == 404
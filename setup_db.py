@@ -71,6 +71,7 @@ try:
             PRIMARY KEY (user_id, role_id)
         )
     """)
+    cursor2.execute("CREATE INDEX IF NOT EXISTS ix_user_roles_role_id_user_id ON user_roles (role_id, user_id)")
     
     # Create role_permissions junction table
     cursor2.execute("""
@@ -81,9 +82,49 @@ try:
         )
     """)
     
+    # Create role_hierarchy table (parent role inherits the child's permissions)
+    cursor2.execute("""
+        CREATE TABLE IF NOT EXISTS role_hierarchy (
+            parent_id INTEGER REFERENCES roles(id),
+            child_id INTEGER REFERENCES roles(id),
+            PRIMARY KEY (parent_id, child_id)
+        )
+    """)
+    
+    # Create policy version counter and change log (cross-worker cache invalidation)
+    cursor2.execute("""
+        CREATE TABLE IF NOT EXISTS policy_version (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor2.execute("""
+        CREATE TABLE IF NOT EXISTS policy_changes (
+            id SERIAL PRIMARY KEY,
+            version INTEGER NOT NULL,
+            user_id INTEGER,
+            role_id INTEGER
+        )
+    """)
+    cursor2.execute("CREATE INDEX IF NOT EXISTS ix_policy_changes_version ON policy_changes (version)")
+    # The single counter row exists before any worker records a change
+    cursor2.execute("INSERT INTO policy_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+    
+    # Create revoked_tokens table (rows are purged once the token has expired)
+    cursor2.execute("""
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            id SERIAL PRIMARY KEY,
+            jti VARCHAR(255) UNIQUE NOT NULL,
+            user_id INTEGER,
+            expires_at INTEGER NOT NULL
+        )
+    """)
+    cursor2.execute("CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens (expires_at)")
+    
     # Clear existing data (fresh setup)
     cursor2.execute("DELETE FROM user_roles")
     cursor2.execute("DELETE FROM role_permissions")
+    cursor2.execute("DELETE FROM role_hierarchy")
     cursor2.execute("DELETE FROM users")
     cursor2.execute("DELETE FROM roles")
     cursor2.execute("DELETE FROM permissions")